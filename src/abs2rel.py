@@ -9,6 +9,45 @@ usage = u"""usage: %prog featurefile
 ラベリングされたアクセント型を相対ラベルに置き換える
 """
 
+def abs2rel_label(aType1, nmora, ans):
+    """アクセント型 ans を aType1 に対する相対ラベルに変換"""
+    # アクセントタイプがなければ、0 とみなしてしまう
+    if aType1 == "*": aType1 = 0
+
+    nmora = int(nmora)
+    aType1 = int(aType1)
+    ans = int(ans)
+
+    if aType1 != 0:
+        if ans == 0:
+            ans_rel = "non" # アクセント核消失
+        elif ans == aType1:
+            ans_rel = "same" # アクセント核保存
+        elif ans == aType1-1:
+            ans_rel = "same-1" # アクセント核が一つ前に移動
+        elif ans == nmora:
+            ans_rel = "mora" # 最終モーラアクセント型へ（もともと核が最終モーラにあった場合を除く）
+        elif ans == 1:
+            ans_rel = "atama" # 頭高型へ（１モーラのものを除く）
+        elif ans == nmora-1:
+            ans_rel = "mora-1" # 最終モーラ一つ前アクセント型へ（もともとその位置にアクセントがあるか、頭高型の場合を除く）
+        else:
+            ans_rel = str(ans - aType1) # その他は、もとの位置からの移動幅
+    else:
+        if ans == 0:
+            ans_rel = "samenon" # アクセント核消失のまま
+        elif ans == nmora:
+            ans_rel = "mora" # 最終モーラアクセント型へ
+        elif ans == 1:
+            ans_rel = "atama" # 頭高型へ（１モーラのものを除く）
+        elif ans == nmora-1:
+            ans_rel = "mora-1" # 最終モーラ一つ前アクセント型へ（頭高型の場合を除く）
+        else:
+            ans_rel = str(ans - 0) # その他は、もとの位置からの移動幅
+
+    return ans_rel
+
+
 def abs2rel_text(text):
     output = []
     # 入力ファイルのフォーマット
@@ -28,47 +67,21 @@ def abs2rel_text(text):
             continue
         features = line.split()
 
-        aType1, nmora, ans = features[30], features[13], features[-1]
-
-        # アクセントタイプがなければ、0 とみなしてしまう
-        if aType1 == "*": aType1 = 0
-
-        nmora = int(nmora)
-        aType1 = int(aType1)
-        ans = int(ans)
-
-        if aType1 != 0:
-            if ans == 0:
-                ans_rel = "non" # アクセント核消失
-            elif ans == aType1:
-                ans_rel = "same" # アクセント核保存
-            elif ans == aType1-1:
-                ans_rel = "same-1" # アクセント核が一つ前に移動
-            elif ans == nmora:
-                ans_rel = "mora" # 最終モーラアクセント型へ（もともと核が最終モーラにあった場合を除く）
-            elif ans == 1:
-                ans_rel = "atama" # 頭高型へ（１モーラのものを除く）
-            elif ans == nmora-1:
-                ans_rel = "mora-1" # 最終モーラ一つ前アクセント型へ（もともとその位置にアクセントがあるか、頭高型の場合を除く）
-            else:
-                ans_rel = str(ans - aType1) # その他は、もとの位置からの移動幅
-        else:
-            if ans == 0:
-                ans_rel = "samenon" # アクセント核消失のまま
-            elif ans == nmora:
-                ans_rel = "mora" # 最終モーラアクセント型へ
-            elif ans == 1:
-                ans_rel = "atama" # 頭高型へ（１モーラのものを除く）
-            elif ans == nmora-1:
-                ans_rel = "mora-1" # 最終モーラ一つ前アクセント型へ（頭高型の場合を除く）
-            else:
-                ans_rel = str(ans - 0) # その他は、もとの位置からの移動幅
+        ans_rel = abs2rel_label(features[30], features[13], features[-1])
 
         output.append(" ".join(features[:-1] + [ans_rel]))
 
     return "\n".join(output)
 
 
+def abs2rel_records(phrases):
+    """アクセント句（Morpheme のリスト）ごとに、最後のラベルを相対ラベルに置き換える"""
+    for phrase in phrases:
+        for m in phrase:
+            m.labels[-1] = abs2rel_label(m.aType1, m.nmora, m.labels[-1])
+    return phrases
+
+
 def main(argv=None):
     parser = OptionParser(usage=usage)
     (options,args) = parser.parse_args(argv)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from array import array
+
+import numpy as np
+
+from morpheme import FIELDS, Morpheme
+from rule import rule_records
+
+FIELD_INDEX = {name: index for index, name in enumerate(FIELDS)}
+
+# Relative labels of abs2rel (see abs2rel_label)
+REL_NON = "non"
+REL_SAME = "same"
+REL_SAME_1 = "same-1"
+REL_MORA = "mora"
+REL_ATAMA = "atama"
+REL_MORA_1 = "mora-1"
+REL_SAMENON = "samenon"
+
+# Kinds of relative labels for rel2abs_columns
+_KIND_INT = 0
+_KIND_BAD = 1
+_KIND_SAME_1 = 2
+_KIND_MORA = 3
+_KIND_ATAMA = 4
+_KIND_MORA_1 = 5
+_KIND_ZERO = 6
+_KIND_ATYPE = 7
+
+
+class StringPool:
+    """Interned strings referred to by int ids"""
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def intern(self, string: str) -> int:
+        index = self.ids.get(string)
+        if index is None:
+            index = len(self.strings)
+            self.ids[string] = index
+            self.strings.append(string)
+        return index
+
+    def intern_values(self, values: np.ndarray) -> np.ndarray:
+        """Return the ids of str(value) for an array of values"""
+        unique, inverse = np.unique(values, return_inverse=True)
+        ids = np.array([self.intern(str(value)) for value in unique.tolist()], dtype=np.int32)
+        return ids[inverse].astype(np.int32, copy=False)
+
+
+class AccentColumns:
+    """Feature columns of many phrases stored as struct-of-arrays.
+
+    `ids[FIELD_INDEX[name]]` holds the interned string ids of one column (the
+    35 columns mkdata_accent adds up to), and `offsets[i]:offsets[i + 1]` is
+    the range of morphemes of phrase i. `nmora` and `aType1` are kept as int
+    arrays for the vectorized relabelling.
+    """
+
+    def __init__(self, pool: StringPool, ids: np.ndarray, offsets: np.ndarray):
+        self.pool = pool
+        self.ids = ids
+        self.offsets = offsets
+        self.nmora = self.int_column("nmora")
+        # abs2rel and rel2abs both read an undefined aType1 as 0
+        self.aType1 = self.int_column("aType1", {"*": 0})
+
+    @classmethod
+    def from_records(cls, phrases, pool: StringPool | None = None) -> "AccentColumns":
+        """Build the columns from phrases of records processed by mkdata_accent"""
+        if pool is None:
+            pool = StringPool()
+        intern = pool.intern
+        buffers = [array("i") for _ in FIELDS]
+        offsets = array("q", [0])
+        for phrase in phrases:
+            for morpheme in phrase:
+                for buffer, value in zip(buffers, morpheme.columns()):
+                    buffer.append(intern(value))
+            offsets.append(offsets[-1] + len(phrase))
+
+        ids = np.empty((len(FIELDS), offsets[-1]), dtype=np.int32)
+        for index, buffer in enumerate(buffers):
+            ids[index] = np.frombuffer(buffer, dtype=np.int32)
+        return cls(pool, ids, np.frombuffer(offsets, dtype=np.int64).copy())
+
+    def __len__(self) -> int:
+        return self.ids.shape[1]
+
+    @property
+    def nphrases(self) -> int:
+        return len(self.offsets) - 1
+
+    def column(self, name: str) -> np.ndarray:
+        return self.ids[FIELD_INDEX[name]]
+
+    def int_column(self, name: str, defaults: dict[str, int] | None = None) -> np.ndarray:
+        """Convert a column of numeric strings to an int array"""
+        unique, inverse = np.unique(self.column(name), return_inverse=True)
+        values = []
+        for index in unique.tolist():
+            string = self.pool.strings[index]
+            if defaults is not None and string in defaults:
+                values.append(defaults[string])
+            else:
+                values.append(int(string))
+        return np.array(values, dtype=np.int32)[inverse]
+
+    def _phrase_columns(self, index: int, labels) -> list[list[str]]:
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        ids = self.ids[:, start:stop]
+        if labels:
+            ids = np.vstack([ids] + [label[start:stop] for label in labels])
+        strings = self.pool.strings
+        return [[strings[i] for i in row] for row in ids.T.tolist()]
+
+    def phrase_rows(self, index: int, *labels: np.ndarray) -> list[str]:
+        """Serialize phrase `index` to rows, followed by the given label id columns"""
+        return [" ".join(columns) for columns in self._phrase_columns(index, labels)]
+
+    def phrase_records(self, index: int, *labels: np.ndarray) -> list[Morpheme]:
+        """Materialize phrase `index` as records, with the given label id columns"""
+        return [Morpheme.from_columns(columns) for columns in self._phrase_columns(index, labels)]
+
+
+def rule_columns(batch: AccentColumns) -> np.ndarray:
+    """Estimate the accent of every morpheme with the rules (as in rule_records)
+
+    The rules walk a phrase morpheme by morpheme, so they run phrase by phrase
+    on records materialized from the columns. Like rule_text, an undefined
+    aType1 is rewritten to "0".
+    """
+    accent = np.zeros(len(batch), dtype=np.int32)
+    for index in range(batch.nphrases):
+        phrase = batch.phrase_records(index)
+        rule_records([phrase])
+        start = batch.offsets[index]
+        accent[start:start + len(phrase)] = [int(m.labels[-1]) for m in phrase]
+
+    aType1 = batch.column("aType1")
+    star = batch.pool.ids.get("*")
+    if star is not None:
+        aType1[aType1 == star] = batch.pool.intern("0")
+    return accent
+
+
+def abs2rel_columns(batch: AccentColumns, accent: np.ndarray) -> np.ndarray:
+    """Replace accent types with relative label ids (vectorized abs2rel_label)"""
+    aType1, nmora = batch.aType1, batch.nmora
+    accented = aType1 != 0
+    conditions = [
+        accented & (accent == 0),
+        accented & (accent == aType1),
+        accented & (accent == aType1 - 1),
+        ~accented & (accent == 0),
+        accent == nmora,
+        accent == 1,
+        accent == nmora - 1,
+    ]
+    names = [REL_NON, REL_SAME, REL_SAME_1, REL_SAMENON, REL_MORA, REL_ATAMA, REL_MORA_1]
+    choices = [np.int32(batch.pool.intern(name)) for name in names]
+
+    # Other accent types are labelled by their shift from aType1
+    labels = batch.pool.intern_values(accent - aType1)
+    return np.select(conditions, choices, labels).astype(np.int32)
+
+
+def rel2abs_columns(batch: AccentColumns, labels: np.ndarray) -> np.ndarray:
+    """Replace relative label ids with accent types (vectorized rel2abs_label)"""
+    unique, inverse = np.unique(labels, return_inverse=True)
+    kinds = np.empty(len(unique), dtype=np.int8)
+    values = np.zeros(len(unique), dtype=np.int32)
+    for i, index in enumerate(unique.tolist()):
+        label = batch.pool.strings[index]
+        if label in (REL_NON, REL_SAMENON):
+            # "non" is 0 for either aType1, and "samenon" is aType1 either way
+            kinds[i] = _KIND_ZERO if label == REL_NON else _KIND_ATYPE
+        elif label == REL_SAME:
+            kinds[i] = _KIND_ATYPE
+        elif label == REL_SAME_1:
+            kinds[i] = _KIND_SAME_1
+        elif label == REL_MORA:
+            kinds[i] = _KIND_MORA
+        elif label == REL_ATAMA:
+            kinds[i] = _KIND_ATAMA
+        elif label == REL_MORA_1:
+            kinds[i] = _KIND_MORA_1
+        else:
+            try:
+                values[i] = int(label)
+                kinds[i] = _KIND_INT
+            except ValueError:
+                kinds[i] = _KIND_BAD
+    kind = kinds[inverse]
+    value = values[inverse]
+
+    aType1, nmora = batch.aType1, batch.nmora
+    return np.select(
+        [
+            kind == _KIND_INT,
+            kind == _KIND_ZERO,
+            kind == _KIND_SAME_1,
+            kind == _KIND_MORA,
+            kind == _KIND_ATAMA,
+            kind == _KIND_MORA_1,
+        ],
+        [
+            value + aType1,
+            0,
+            np.where(aType1 != 0, aType1 - 1, 0),
+            nmora,
+            1,
+            nmora - 1,
+        ],
+        aType1,
+    ).astype(np.int32)
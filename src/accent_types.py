@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import NamedTuple
+
+repercent = re.compile("%")
+reatmark = re.compile("@")
+redoushi = re.compile("動詞%F")
+rekeiyoshi = re.compile("形容詞%F")
+remeishi = re.compile("名詞%F")
+ref6 = re.compile("F6")
+
+# Distinct aConType / aModType strings are few (a few thousand in UniDic)
+PARSE_CACHE_SIZE = 65536
+
+
+class AConType(NamedTuple):
+    """Parsed accent connection type (aConType), e.g. "動詞%F2@0,名詞%F1"
+
+    rules maps a part of speech to its (type, value); value is the string
+    after "@" ("3,4" for F6) or 0 without one. type is the type of the last
+    item, "C5" for an undefined one. fv/fa/fn are the verb, adjective and
+    noun items mkdata_accent uses as aConTypeFV/FA/FN ("*" if none).
+    """
+
+    items: tuple
+    rules: MappingProxyType
+    type: str
+    fv: str
+    fa: str
+    fn: str
+
+
+class AModType(NamedTuple):
+    """Parsed accent modification type (aModType), e.g. "M1@1" or "*" """
+
+    type: str
+    value: int
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_acontype(aConType: str) -> AConType:
+    """Parse an aConType string once and share the result process-wide"""
+    items = aConType.split(",")
+    # F6 has two values separated by a comma, so join them back
+    for ii in range(0, len(items)):
+        if ii >= len(items):
+            break
+        if ref6.search(items[ii]) is not None:
+            items[ii] = items[ii] + "," + items[ii + 1]
+            items.remove(items[ii + 1])
+
+    rules = {}
+    type_ = None
+    fv = fa = fn = "*"
+    for item in items:
+        if repercent.search(item) is not None:
+            # pos%type@value
+            pos, rule = item.split("%")[0], item.split("%")[1]
+            type_ = rule.split("@")[0]
+            if reatmark.search(rule) is not None:
+                rules[pos] = (type_, rule.split("@")[1])
+            else:
+                rules[pos] = (type_, 0)
+        else:
+            # C* types have no %; an undefined type is C5
+            type_ = item
+            if type_ == "*":
+                type_ = "C5"
+
+        if redoushi.search(item) is not None:
+            fv = item
+        if rekeiyoshi.search(item) is not None:
+            fa = item
+        if remeishi.search(item) is not None:
+            fn = item
+
+    return AConType(tuple(items), MappingProxyType(rules), type_, fv, fa, fn)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_amodtype(aModType: str) -> AModType:
+    """Parse an aModType string once and share the result process-wide"""
+    if aModType == "*":
+        return AModType("*", 0)
+    type_, value = aModType.split("@")
+    return AModType(type_, int(value))
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import gc
+import hashlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from abs2rel import abs2rel_text
+from feature_index import dictionary_hash
+from format_accent import format_accent_text
+from mkdata_accent import mkdata_accent_text
+from mora import NON_MORA, pair_moras, split_moras
+from rel2abs import rel2abs_text
+from rule import rule_text
+from text2accent import (
+    CRF_BACKEND,
+    get_crf_decoder,
+    normalize_accent,
+    normalize_input,
+    phrase_memo,
+    process_text,
+    run_crf_test,
+    seikei_from_mecab,
+    split_by_pyopenjtalk,
+    warm_up,
+)
+
+CORPORA = ("short", "medium", "document")
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS_DIR = os.path.join(BENCH_DIR, "bench_corpus")
+DEFAULT_FIXTURE_DIR = os.path.join(BENCH_DIR, "bench_fixtures")
+# Records what the fixtures of each corpus were generated from
+FIXTURE_MANIFEST = "manifest.json"
+# Bumped when the layout of the fixture files changes
+FIXTURE_FORMAT = 2
+
+# Stages of the text pipeline in order: (name, function of the previous stage's output)
+STAGES = (
+    ("segmentation", None),
+    ("mecab", None),
+    ("mkdata_accent", mkdata_accent_text),
+    ("rule", rule_text),
+    ("abs2rel", abs2rel_text),
+    ("crf", lambda text: run_crf_test(text, "model_accent")),
+    ("rel2abs", rel2abs_text),
+    ("format_accent", format_accent_text),
+    ("normalize", normalize_accent),
+)
+
+
+def load_corpus(corpus_dir: str, name: str) -> list[str]:
+    """Load the texts of a corpus: one per line, or the whole file for document"""
+    with open(os.path.join(corpus_dir, f"{name}.txt"), encoding="utf-8") as f:
+        content = f.read()
+    if name == "document":
+        return [content.strip()]
+    return [line for line in content.splitlines() if line.strip()]
+
+
+def fixture_path(fixture_dir: str, corpus: str, stage: str) -> str:
+    return os.path.join(fixture_dir, f"{corpus}.{stage}.txt")
+
+
+def segment(texts: list[str]) -> list[str]:
+    """Segment each text into accent phrases with the call process_text makes"""
+    return [split_by_pyopenjtalk(text) for text in texts]
+
+
+def write_fixtures(texts, corpus: str, fixture_dir: str, mecab_dicdir: str, mecab_userdic: str | None) -> None:
+    """Run the text pipeline once and save the input of each stage
+
+    The segmentation input is saved as one JSON string per text, so texts
+    keep their line breaks and are segmented whole, as process_text does.
+    """
+    os.makedirs(fixture_dir, exist_ok=True)
+    normalized = [normalize_input(text) for text in texts]
+    with open(fixture_path(fixture_dir, corpus, "segmentation"), "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(text, ensure_ascii=False) + "\n" for text in normalized)
+    stage_input = "\n".join(segment(normalized))
+    for name, function in STAGES[1:]:
+        with open(fixture_path(fixture_dir, corpus, name), "w", encoding="utf-8") as f:
+            f.write(stage_input)
+        if name == "mecab":
+            stage_input = seikei_from_mecab(stage_input, mecab_dicdir, mecab_userdic)
+        else:
+            stage_input = function(stage_input)
+
+
+def read_fixture(fixture_dir: str, corpus: str, stage: str):
+    """Load the input of a stage: a list of texts for segmentation, else the text"""
+    with open(fixture_path(fixture_dir, corpus, stage), encoding="utf-8") as f:
+        if stage == "segmentation":
+            return [json.loads(line) for line in f]
+        return f.read()
+
+
+def file_hash(path: str) -> str | None:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def fixture_inputs(corpus: str, args) -> dict:
+    """Describe what the fixtures of a corpus are generated from"""
+    import pyopenjtalk
+
+    paths = [args.mecab_dicdir] + ([args.mecab_userdic] if args.mecab_userdic else [])
+    return {
+        "format": FIXTURE_FORMAT,
+        "corpus": file_hash(os.path.join(args.corpus_dir, f"{corpus}.txt")),
+        "dictionary": dictionary_hash(paths).hex(),
+        "model": file_hash("model_accent"),
+        "pyopenjtalk": getattr(pyopenjtalk, "__version__", None),
+    }
+
+
+def read_manifest(fixture_dir: str) -> dict:
+    try:
+        with open(os.path.join(fixture_dir, FIXTURE_MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(fixture_dir: str, manifest: dict) -> None:
+    with open(os.path.join(fixture_dir, FIXTURE_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def stage_function(name: str, mecab_dicdir: str, mecab_userdic: str | None):
+    if name == "segmentation":
+        return segment
+    if name == "mecab":
+        return lambda text: seikei_from_mecab(text, mecab_dicdir, mecab_userdic)
+    return dict(STAGES)[name]
+
+
+def count_morphemes(fixture_dir: str, corpus: str) -> int:
+    """Count the morphemes of a corpus in its mkdata_accent fixture"""
+    with open(fixture_path(fixture_dir, corpus, "mkdata_accent"), encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def measure(function, args, min_time: float, min_runs: int, setup=None) -> dict:
+    """Time repeated calls of function(*args) and summarize them.
+
+    Runs until both min_time seconds and min_runs calls are reached. setup is
+    called untimed before each call. Peak memory is traced on one extra call.
+    """
+    durations = []
+    gc.collect()
+    start = time.perf_counter()
+    while len(durations) < min_runs or time.perf_counter() - start < min_time:
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - t0)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durations.sort()
+    mean = statistics.fmean(durations)
+    return {
+        "runs": len(durations),
+        "mean": mean,
+        "stdev": statistics.stdev(durations) if len(durations) > 1 else 0.0,
+        "min": durations[0],
+        "p50": percentile(durations, 50),
+        "p90": percentile(durations, 90),
+        "p99": percentile(durations, 99),
+        "max": durations[-1],
+        "ops_per_sec": 1 / mean if mean else None,
+        "peak_memory_bytes": peak,
+    }
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Percentile by linear interpolation between closest ranks"""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def bench_stages(corpus: str, args) -> dict:
+    """Time each stage function on its fixture input"""
+    morphemes = count_morphemes(args.fixtures, corpus)
+    results = {}
+    for name, _ in STAGES:
+        stage_input = read_fixture(args.fixtures, corpus, name)
+        function = stage_function(name, args.mecab_dicdir, args.mecab_userdic)
+        result = measure(function, (stage_input,), args.min_time, args.min_runs)
+        result["morphemes"] = morphemes
+        result["us_per_morpheme"] = result["mean"] / morphemes * 1e6 if morphemes else None
+        results[name] = result
+    return results
+
+
+def legacy_split_moras(pron: str) -> list[str]:
+    """Mora split mkdata_accent and rule.x_mora_me did inline before mora.split_moras"""
+    index_mora = 0
+    mora = []
+    for p in pron:
+        if p not in NON_MORA:
+            mora.append(p)
+            index_mora += 1
+        else:
+            mora[index_mora-1] += p
+    return mora
+
+
+def legacy_pair_moras(pron: str) -> list[str]:
+    """Mora split format_accent.format_phrase did inline before mora.pair_moras"""
+    mora_list = []
+    i = 0
+    while i < len(pron):
+        if i + 1 < len(pron) and pron[i + 1] in NON_MORA:
+            mora_list.append(pron[i] + pron[i + 1])
+            i += 2
+        else:
+            mora_list.append(pron[i])
+            i += 1
+    return mora_list
+
+
+def bench_moras(corpus: str, args) -> dict:
+    """Time the mora tokenizers against the loops they replaced, on the pronunciations of a corpus"""
+    with open(fixture_path(args.fixtures, corpus, "mkdata_accent"), encoding="utf-8") as f:
+        prons = [line.split(" ")[1] for line in f if line.strip()]
+    # Pronunciations the TASET split fails on (a leading small kana) are left out
+    prons = [pron for pron in prons if pron != "*" and pron[0] not in NON_MORA]
+
+    def run(function):
+        for pron in prons:
+            function(pron)
+
+    results = {}
+    for name, legacy, tokenizer in (
+        ("split", legacy_split_moras, split_moras),
+        ("pair", legacy_pair_moras, pair_moras),
+    ):
+        results[name] = {
+            "identical": all(tuple(legacy(pron)) == tokenizer(pron) for pron in prons),
+            "legacy": measure(run, (legacy,), args.min_time, args.min_runs),
+            "cold": measure(run, (tokenizer,), args.min_time, args.min_runs, setup=tokenizer.cache_clear),
+            "warm": measure(run, (tokenizer,), args.min_time, args.min_runs),
+        }
+    results["pronunciations"] = len(prons)
+    return results
+
+
+def bench_process_text(texts, args, memo: bool) -> dict:
+    """Time process_text over all texts of a corpus, with a cold or warm phrase memo"""
+    mecab_dicdir, mecab_userdic = args.mecab_dicdir, args.mecab_userdic
+
+    # Texts process_text fails on are left out of the timing
+    processed = []
+    morphemes = 0
+    for text in texts:
+        timings = {}
+        try:
+            process_text(text, mecab_dicdir, mecab_userdic, timings)
+        except Exception as e:
+            print(f"skipped {text[:20]!r}: {e}", file=sys.stderr)
+            continue
+        processed.append(text)
+        morphemes += timings["morphemes"]
+    skipped = len(texts) - len(processed)
+    texts = processed
+
+    def run():
+        for text in texts:
+            process_text(text, mecab_dicdir, mecab_userdic)
+
+    result = measure(run, (), args.min_time, args.min_runs, setup=None if memo else phrase_memo.clear)
+    result["texts"] = len(texts)
+    result["skipped_texts"] = skipped
+    result["characters"] = sum(len(text) for text in texts)
+    result["morphemes"] = morphemes
+    result["texts_per_sec"] = len(texts) / result["mean"]
+    result["us_per_morpheme"] = result["mean"] / morphemes * 1e6 if morphemes else None
+    return result
+
+
+def environment(args) -> dict:
+    """Describe what the results were measured with (times are in seconds)"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    from mecab_tagger import get_tagger as get_mecab_tagger
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "crf_backend": CRF_BACKEND,
+        "crf_in_process": get_crf_decoder("model_accent") is not None,
+        "mecab_in_process": get_mecab_tagger(args.mecab_dicdir, args.mecab_userdic) is not None,
+        "phrase_memo_max_entries": phrase_memo.max_entries,
+        "mora_cache_size": split_moras.cache_info().maxsize,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the accent pipeline stages and process_text")
+    parser.add_argument("--mecab-dicdir", default=os.environ.get("MECAB_DICDIR", "/usr/src/app/unidic"), help="MeCab dictionary directory")
+    parser.add_argument("--mecab-userdic", default=os.environ.get("MECAB_USERDIC", "/usr/src/app/user.dic"), help="MeCab user dictionary path (empty to disable)")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="Directory of short.txt, medium.txt and document.txt")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURE_DIR, help="Directory of stage input fixtures")
+    parser.add_argument("--write-fixtures", action="store_true", help="Regenerate the stage fixtures and their manifest before benchmarking (missing ones are always written)")
+    parser.add_argument("--corpus", choices=CORPORA, action="append", help="Corpus to run (repeatable, default: all)")
+    parser.add_argument("--skip-stages", action="store_true", help="Only time process_text end to end")
+    parser.add_argument("--skip-e2e", action="store_true", help="Only time the stages")
+    parser.add_argument("--skip-moras", action="store_true", help="Skip the mora tokenizer microbenchmark")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Minimum seconds to run each benchmark")
+    parser.add_argument("--min-runs", type=int, default=5, help="Minimum runs of each benchmark")
+    parser.add_argument("-o", "--output", help="Write results as JSON to this file (default: stdout)")
+    args = parser.parse_args(argv)
+    args.mecab_userdic = args.mecab_userdic or None
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    corpora = args.corpus or list(CORPORA)
+
+    warm_up(args.mecab_dicdir, args.mecab_userdic)
+    results = {"environment": environment(args), "stages": {}, "moras": {}, "process_text": {}}
+    manifest = read_manifest(args.fixtures)
+    for corpus in corpora:
+        texts = load_corpus(args.corpus_dir, corpus)
+        if not args.skip_stages:
+            # Fixtures are written on the first run and afterwards only on
+            # request, so stage timings always compare the same inputs unless
+            # they are refreshed on purpose
+            inputs = fixture_inputs(corpus, args)
+            if args.write_fixtures or corpus not in manifest:
+                print(f"{corpus}: writing fixtures to {args.fixtures}", file=sys.stderr)
+                write_fixtures(texts, corpus, args.fixtures, args.mecab_dicdir, args.mecab_userdic)
+                manifest[corpus] = inputs
+                write_manifest(args.fixtures, manifest)
+            elif manifest[corpus] != inputs:
+                changed = ", ".join(key for key in inputs if manifest[corpus].get(key) != inputs[key])
+                sys.exit(f"bench: fixtures for {corpus} were generated from another {changed} (run with --write-fixtures)")
+            results["stages"][corpus] = bench_stages(corpus, args)
+            if not args.skip_moras:
+                results["moras"][corpus] = bench_moras(corpus, args)
+        if not args.skip_e2e:
+            results["process_text"][corpus] = {
+                "cold": bench_process_text(texts, args, memo=False),
+                "warm": bench_process_text(texts, args, memo=True),
+            }
+        print(f"{corpus}: done", file=sys.stderr)
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+from text2accent import process_text, process_texts
+
+DEFAULT_CHUNK_SIZE = 256
+
+
+def read_records(paths, input_format: str):
+    """Yield (text, id, error) of each input line lazily from files, or stdin for "-"
+
+    A JSONL line that is not an object with a text string is yielded with
+    its error and no text, to be reported in its output line.
+    """
+    for path in paths:
+        f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        try:
+            for line in f:
+                line = line.rstrip("\r\n")
+                if input_format == "jsonl":
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError as e:
+                        yield None, None, f"invalid JSON: {e}"
+                        continue
+                    if not isinstance(record, dict) or not isinstance(record.get("text"), str):
+                        yield None, record.get("id") if isinstance(record, dict) else None, "no text string"
+                        continue
+                    yield record["text"], record.get("id"), None
+                else:
+                    yield line, None, None
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+def chunked(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def process_one(text: str, mecab_dicdir: str, mecab_userdic: str | None) -> tuple:
+    """Process one text, returning (accent, error)"""
+    try:
+        return process_text(text, mecab_dicdir, mecab_userdic), None
+    except Exception as e:
+        return None, str(e)
+
+
+def process_chunk(texts: list[str], mecab_dicdir: str, mecab_userdic: str | None) -> list[tuple]:
+    """Process a chunk of texts, returning (accent, error) for each
+
+    Stages run on the whole chunk at once (MeCab, the rules, the CRF) fail
+    for all of its texts, which are then processed again one at a time so
+    that only the failing ones get an error.
+    """
+    try:
+        results = process_texts(texts, mecab_dicdir, mecab_userdic, return_exceptions=True)
+    except Exception:
+        return [process_one(text, mecab_dicdir, mecab_userdic) for text in texts]
+    return [(None, str(result)) if isinstance(result, Exception) else (result, None) for result in results]
+
+
+def process_isolated(texts: list[str], mecab_dicdir: str, mecab_userdic: str | None, jobs: int) -> list[tuple]:
+    """Process texts one at a time on worker processes after a worker died on their chunk
+
+    A text a worker dies on again gets an error instead of stopping the run.
+    """
+    from parallel import discard_pool, get_pool
+
+    results = []
+    for text in texts:
+        pool = get_pool(jobs, mecab_dicdir, mecab_userdic)
+        try:
+            results.append(pool.submit(process_one, text, mecab_dicdir, mecab_userdic).result())
+        except BrokenProcessPool as e:
+            discard_pool(pool)
+            results.append((None, f"worker process died: {e}"))
+    return results
+
+
+def annotate(records, mecab_dicdir: str, mecab_userdic: str | None, jobs: int, chunk_size: int):
+    """Yield (chunk of records, results) in input order.
+
+    Chunks are processed on jobs worker processes with at most twice as many
+    chunks in flight, so memory does not grow with the input. Records with
+    an input error are not processed and get None as their result. When a
+    worker dies, the pool is replaced and the texts of the chunks it had are
+    processed again one at a time.
+    """
+    chunks = chunked(records, chunk_size)
+    if jobs <= 1:
+        for chunk in chunks:
+            texts = [text for text, _, error in chunk if error is None]
+            yield chunk, merge_results(chunk, process_chunk(texts, mecab_dicdir, mecab_userdic))
+        return
+
+    from parallel import discard_pool, get_pool, log_fallback
+
+    def wait(chunk, texts, pool, future):
+        try:
+            return merge_results(chunk, future.result())
+        except BrokenProcessPool as e:
+            discard_pool(pool)
+            log_fallback(e)
+            return merge_results(chunk, process_isolated(texts, mecab_dicdir, mecab_userdic, jobs))
+
+    pending = deque()
+    for chunk in chunks:
+        texts = [text for text, _, error in chunk if error is None]
+        pool = get_pool(jobs, mecab_dicdir, mecab_userdic)
+        pending.append((chunk, texts, pool, pool.submit(process_chunk, texts, mecab_dicdir, mecab_userdic)))
+        if len(pending) >= jobs * 2:
+            chunk, *rest = pending.popleft()
+            yield chunk, wait(chunk, *rest)
+    while pending:
+        chunk, *rest = pending.popleft()
+        yield chunk, wait(chunk, *rest)
+
+
+def merge_results(chunk, results: list[tuple]) -> list:
+    """Align the results of the texts of a chunk with its records (None for input errors)"""
+    results = iter(results)
+    return [next(results) if error is None else None for _, _, error in chunk]
+
+
+def load_progress(path: str) -> dict:
+    """Return the input lines done and the output size at the last checkpoint"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"lines": 0, "offset": 0}
+
+
+def save_progress(path: str, lines: int, offset: int) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"lines": lines, "offset": offset}, f)
+    os.replace(tmp_path, path)
+
+
+def write_jsonl(
+    records,
+    out,
+    mecab_dicdir: str,
+    mecab_userdic: str | None,
+    jobs: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: str | None = None,
+    start_line: int = 0,
+) -> int:
+    """Annotate records and write one JSON object per line to the binary stream out.
+
+    After each chunk the output is flushed and, with a progress path, the
+    number of input lines done and the output size are saved. Returns the
+    number of input lines done.
+    """
+    line_number = start_line
+    for chunk, results in annotate(records, mecab_dicdir, mecab_userdic, jobs, chunk_size):
+        lines = []
+        for (text, record_id, input_error), result in zip(chunk, results):
+            line_number += 1
+            item = {"line": line_number}
+            if record_id is not None:
+                item["id"] = record_id
+            if input_error is not None:
+                item["error"] = f"Invalid input: {input_error}"
+                lines.append(json.dumps(item, ensure_ascii=False) + "\n")
+                continue
+            accent, error = result
+            item["text"] = text
+            if error is None:
+                item["accent"] = accent
+            else:
+                item["error"] = f"Processing failed: {error}"
+            lines.append(json.dumps(item, ensure_ascii=False) + "\n")
+        out.write("".join(lines).encode("utf-8"))
+        out.flush()
+        if progress is not None:
+            os.fsync(out.fileno())
+            save_progress(progress, line_number, out.tell())
+    return line_number
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Annotate a large corpus with accents as JSONL")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="Input files (default: stdin)")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text", help="One text per line, or JSONL objects with text (and id)")
+    parser.add_argument("-o", "--output", help="Output JSONL file (default: stdout)")
+    parser.add_argument("--progress", help="Progress file (default: OUTPUT.progress)")
+    parser.add_argument("--resume", action="store_true", help="Continue after the lines recorded in the progress file")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Lines processed together by a worker")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--mecab-dicdir", default=os.environ.get("MECAB_DICDIR", "/usr/src/app/unidic"), help="MeCab dictionary directory")
+    parser.add_argument("--mecab-userdic", default=os.environ.get("MECAB_USERDIC", "/usr/src/app/user.dic"), help="MeCab user dictionary path (empty to disable)")
+    args = parser.parse_args(argv)
+    if args.output is None and (args.resume or args.progress):
+        parser.error("--resume and --progress need --output")
+    if args.output is not None and args.progress is None:
+        args.progress = args.output + ".progress"
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mecab_userdic = args.mecab_userdic if args.mecab_userdic else None
+
+    records = read_records(args.inputs, args.format)
+    start_line = 0
+    if args.output is None:
+        out = sys.stdout.buffer
+    elif args.resume:
+        # Drop output written after the last checkpoint and skip the lines done
+        progress = load_progress(args.progress)
+        start_line = progress["lines"]
+        out = open(args.output, "ab")
+        out.truncate(progress["offset"])
+        out.seek(progress["offset"])
+        records = islice(records, start_line, None)
+    else:
+        out = open(args.output, "wb")
+
+    try:
+        done = write_jsonl(
+            records, out, args.mecab_dicdir, mecab_userdic, args.jobs, args.chunk_size, args.progress, start_line
+        )
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"{done} lines done", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
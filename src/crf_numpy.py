@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import struct
+import sys
+import threading
+from optparse import OptionParser
+
+import numpy as np
+
+from crf_tagger import format_result, recolumn, split_sequences
+
+usage = u"""usage: %prog [-m model.txt] testfile
+       %prog -b model [-m model.txt]
+Label CRF++ input with a text model (crf_learn -t) decoded in NumPy, like crf_test,
+or write the text model of a binary model (-b)
+"""
+
+# Binary model header (feature_index.cpp): version, type, cost factor, maxid, xsize, darts size
+BINARY_HEADER = struct.Struct("<IidIII")
+MODEL_VERSION = 100
+
+# Values CRF++ substitutes for rows outside the sequence (feature.cpp)
+kMaxContextSize = 8
+BOS = ["_B-%d" % (i + 1) for i in range(kMaxContextSize)]
+EOS = ["_B+%d" % (i + 1) for i in range(kMaxContextSize)]
+
+remacro = re.compile(r"%x\[(-?\d+),(\d+)\]")
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def compile_template(template, xsize):
+    """Split a template into literal strings and (row, col) references"""
+    parts = []
+    pos = 0
+    for m in remacro.finditer(template):
+        row, col = int(m.group(1)), int(m.group(2))
+        if not -kMaxContextSize <= row <= kMaxContextSize or not 0 <= col < xsize:
+            raise ValueError(f"invalid template: {template}")
+        parts.append(template[pos:m.start()])
+        parts.append((row, col))
+        pos = m.end()
+    if "%" in remacro.sub("", template):
+        raise ValueError(f"invalid template: {template}")
+    parts.append(template[pos:])
+    return tuple(part for part in parts if part != "")
+
+
+class NumpyCrfModel:
+    """CRF++ text model decoded with batched Viterbi in NumPy.
+
+    Scores are accumulated the same way crf_test does (float32 weights summed
+    per template in order, path costs compared in float64, first best label
+    wins ties), so labels match crf_test for the same model.
+    """
+
+    def __init__(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            lines = iter(f.read().split("\n"))
+
+        header = {}
+        for line in lines:
+            if not line:
+                break
+            key, value = line.split(None, 1)
+            header[key] = value
+        self.xsize = int(header["xsize:"])
+        maxid = int(header["maxid:"])
+
+        self.labels = []
+        for line in lines:
+            if not line:
+                break
+            self.labels.append(line)
+
+        unigram_templates = []
+        bigram_templates = []
+        for line in lines:
+            if not line:
+                break
+            if line[0] == "U":
+                unigram_templates.append(compile_template(line, self.xsize))
+            elif line[0] == "B":
+                bigram_templates.append(compile_template(line, self.xsize))
+            else:
+                raise ValueError(f"unknown type: {line} {path}")
+        self.unigram_templates = unigram_templates
+        self.bigram_templates = bigram_templates
+
+        self.feature_ids = {}
+        for line in lines:
+            if not line:
+                break
+            fid, key = line.split(" ", 1)
+            self.feature_ids[key] = int(fid)
+
+        weights = np.array([float(line) for line in lines if line], dtype=np.float64)
+        if len(weights) != maxid:
+            raise ValueError(f"file is broken: {path}")
+        # crf_test keeps weights as float32; the zero block at the end stands in for unknown features
+        nlabels = len(self.labels)
+        self.missing_id = maxid
+        self.weights = np.concatenate(
+            [weights.astype(np.float32), np.zeros(nlabels * nlabels, dtype=np.float32)]
+        )
+
+        # Transition features without macros (the usual "B") do not depend on position
+        self.static_transition = None
+        if all(all(isinstance(part, str) for part in t) for t in bigram_templates):
+            ids = [self.feature_ids.get("".join(t), -1) for t in bigram_templates]
+            self.static_transition = self._transition_scores(np.array(ids, dtype=np.int64))
+
+    def _expand(self, template, columns, pos):
+        size = len(columns)
+        out = []
+        for part in template:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            row, col = part
+            idx = pos + row
+            if idx < 0:
+                out.append(BOS[-idx - 1])
+            elif idx >= size:
+                out.append(EOS[idx - size])
+            else:
+                out.append(columns[idx][col])
+        return "".join(out)
+
+    def _transition_scores(self, ids):
+        """Sum bigram weights for feature ids [..., n] into [..., L, L] scores"""
+        nlabels = len(self.labels)
+        ids = np.where(ids < 0, self.missing_id, ids)
+        offsets = np.arange(nlabels * nlabels)
+        score = np.zeros(ids.shape[:-1] + (nlabels * nlabels,), dtype=np.float32)
+        for k in range(ids.shape[-1]):
+            score += self.weights[ids[..., k, None] + offsets]
+        return score.astype(np.float64).reshape(ids.shape[:-1] + (nlabels, nlabels))
+
+    def tag(self, rows: list[str]) -> list[str]:
+        """Label one sequence of rows"""
+        return self.tag_batch([rows])[0]
+
+    def tag_batch(self, sequences: list[list[str]]) -> list[list[str]]:
+        """Label many sequences at once, padded into one Viterbi batch"""
+        results = [[] for _ in sequences]
+        batch = [(i, rows) for i, rows in enumerate(sequences) if rows]
+        if not batch:
+            return results
+
+        nlabels = len(self.labels)
+        nbatch = len(batch)
+        length = max(len(rows) for _, rows in batch)
+        lengths = np.array([len(rows) for _, rows in batch])
+        feature_ids = self.feature_ids
+
+        unigram = np.full((nbatch, length, len(self.unigram_templates)), -1, dtype=np.int64)
+        bigram = None
+        if self.static_transition is None:
+            bigram = np.full((nbatch, length, len(self.bigram_templates)), -1, dtype=np.int64)
+
+        for b, (_, rows) in enumerate(batch):
+            columns = []
+            for row in rows:
+                cols = [c for c in recolumn.split(row) if c]
+                if len(cols) < self.xsize:
+                    raise ValueError(f"# x is small: size={len(cols)} xsize={self.xsize}")
+                columns.append(cols)
+            for pos in range(len(columns)):
+                for k, template in enumerate(self.unigram_templates):
+                    unigram[b, pos, k] = feature_ids.get(self._expand(template, columns, pos), -1)
+                if bigram is not None and pos > 0:
+                    for k, template in enumerate(self.bigram_templates):
+                        bigram[b, pos, k] = feature_ids.get(self._expand(template, columns, pos), -1)
+
+        # node cost: [B, T, L]
+        unigram = np.where(unigram < 0, self.missing_id, unigram)
+        offsets = np.arange(nlabels)
+        node32 = np.zeros((nbatch, length, nlabels), dtype=np.float32)
+        for k in range(unigram.shape[-1]):
+            node32 += self.weights[unigram[:, :, k, None] + offsets]
+        node = node32.astype(np.float64)
+
+        # path cost: [L(prev), L(cur)] or [B, T, L, L]
+        if bigram is None:
+            transition = self.static_transition
+        else:
+            transition = self._transition_scores(bigram)
+
+        best = node[:, 0, :].copy()
+        backpointers = np.zeros((nbatch, length, nlabels), dtype=np.int64)
+        for t in range(1, length):
+            trans = transition if bigram is None else transition[:, t]
+            cost = (best[:, :, None] + trans) + node[:, t, None, :]
+            prev = np.argmax(cost, axis=1)
+            active = (t < lengths)[:, None]
+            backpointers[:, t] = prev
+            best = np.where(active, np.take_along_axis(cost, prev[:, None, :], axis=1)[:, 0, :], best)
+
+        y = np.zeros((nbatch, length), dtype=np.int64)
+        y[np.arange(nbatch), lengths - 1] = np.argmax(best, axis=1)
+        for t in range(length - 1, 0, -1):
+            active = t < lengths
+            prev = backpointers[np.arange(nbatch), t, y[:, t]]
+            y[:, t - 1] = np.where(active, prev, y[:, t - 1])
+
+        for b, (i, rows) in enumerate(batch):
+            results[i] = [self.labels[label] for label in y[b, : len(rows)]]
+        return results
+
+    def parse(self, text: str) -> str:
+        """Label CRF++ input text, producing the same output as crf_test"""
+        sequences = split_sequences(text)
+        labels = self.tag_batch(sequences)
+        return "".join(format_result(rows, y) for rows, y in zip(sequences, labels))
+
+
+def _read_strings(data: bytes, offset: int) -> tuple[list[str], int]:
+    """Read a size-prefixed block of NUL-terminated strings, skipping padding"""
+    (size,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    strings = [s.decode("utf-8") for s in data[offset:offset + size].split(b"\0") if s]
+    return strings, offset + size
+
+
+def binary_to_text(path: str) -> str:
+    """Return the text model (as crf_learn -t writes it) of a binary CRF++ model
+
+    Feature strings are recovered by walking the double array that maps them
+    to ids. Weights are the float32 values crf_test decodes with.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    version, _, cost_factor, maxid, xsize, dsize = BINARY_HEADER.unpack_from(data, 0)
+    if version // 100 != MODEL_VERSION // 100:
+        raise ValueError(f"model version is different: {version} vs {MODEL_VERSION}")
+    labels, offset = _read_strings(data, BINARY_HEADER.size)
+    templates, offset = _read_strings(data, offset)
+    units = np.frombuffer(data, dtype=np.int32, count=dsize // 4, offset=offset).reshape(-1, 2)
+    weights = np.frombuffer(data, dtype=np.float32, count=maxid, offset=offset + dsize)
+
+    # A unit p belongs to the node whose base is check[p]: it ends a key if
+    # p == base, else it is the child for byte p - base - 1.
+    base = units[:, 0].astype(np.int64)
+    check = units[:, 1].astype(np.int64)
+    order = np.argsort(check, kind="stable")
+    sorted_check = check[order]
+    features = []
+    stack = [(int(base[0]), b"")]
+    while stack:
+        node, prefix = stack.pop()
+        start, end = np.searchsorted(sorted_check, [node, node + 1])
+        for p in order[start:end].tolist():
+            if p == node:
+                if base[p] < 0:
+                    features.append((prefix, -int(base[p]) - 1))
+            elif 0 < p - node <= 256:
+                stack.append((int(base[p]), prefix + bytes((p - node - 1,))))
+    features.sort()
+
+    lines = [
+        f"version: {version}",
+        f"cost-factor: {cost_factor:g}",
+        f"maxid: {maxid}",
+        f"xsize: {xsize}",
+        "",
+        *labels,
+        "",
+        *templates,
+        "",
+        *(f"{fid} {key.decode('utf-8')}" for key, fid in features),
+        "",
+        *(f"{float(weight):.16f}" for weight in weights),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def get_model(path: str) -> NumpyCrfModel:
+    """Return the shared model loaded from a CRF++ text model file"""
+    model = _models.get(path)
+    if model is None:
+        with _models_lock:
+            model = _models.get(path)
+            if model is None:
+                model = NumpyCrfModel(path)
+                _models[path] = model
+    return model
+
+
+def main(argv=None):
+    parser = OptionParser(usage=usage)
+    parser.add_option("-m", "--model", dest="model", default="model_accent.txt")
+    parser.add_option("-b", "--binary-model", dest="binary_model", help="write the text model of this binary model to the -m path")
+    (options, args) = parser.parse_args(argv)
+
+    if options.binary_model:
+        text = binary_to_text(options.binary_model)
+        with open(options.model, "w", encoding="utf-8") as f:
+            f.write(text)
+        return
+
+    if len(args) < 1:
+        print("error: too few arguments\n", file=sys.stderr)
+        parser.print_help()
+        sys.exit(1)
+
+    testfile = open(args[0], encoding="utf-8")
+    sys.stdout.write(get_model(options.model).parse(testfile.read()))
+
+
+if __name__ == "__main__":
+    main()
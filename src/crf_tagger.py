@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import ctypes
+import ctypes.util
+import os
+import re
+import threading
+
+DEFAULT_CRFPP_LIBRARY = "/usr/local/lib/libcrfpp.so"
+
+# crf_test splits columns on spaces and tabs only
+recolumn = re.compile("[\t ]+")
+
+# libcrfpp handle (None: not loaded yet, False: unavailable)
+_library = None
+_taggers = {}
+_taggers_lock = threading.Lock()
+
+
+def load_library():
+    """Load libcrfpp once per process, or return None if it is unavailable"""
+    global _library
+    if _library is None:
+        path = os.environ.get("CRFPP_LIBRARY", DEFAULT_CRFPP_LIBRARY)
+        if not os.path.exists(path):
+            path = ctypes.util.find_library("crfpp")
+        try:
+            if path is None:
+                raise OSError("libcrfpp not found")
+            lib = ctypes.CDLL(path)
+        except OSError:
+            _library = False
+            return None
+
+        lib.crfpp_model_new.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_char_p)]
+        lib.crfpp_model_new.restype = ctypes.c_void_p
+        lib.crfpp_model_strerror.argtypes = [ctypes.c_void_p]
+        lib.crfpp_model_strerror.restype = ctypes.c_char_p
+        lib.crfpp_model_destroy.argtypes = [ctypes.c_void_p]
+        lib.crfpp_model_destroy.restype = None
+        lib.crfpp_model_new_tagger.argtypes = [ctypes.c_void_p]
+        lib.crfpp_model_new_tagger.restype = ctypes.c_void_p
+        lib.crfpp_destroy.argtypes = [ctypes.c_void_p]
+        lib.crfpp_destroy.restype = None
+        lib.crfpp_clear.argtypes = [ctypes.c_void_p]
+        lib.crfpp_clear.restype = ctypes.c_int
+        lib.crfpp_add.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+        lib.crfpp_add.restype = ctypes.c_int
+        lib.crfpp_parse.argtypes = [ctypes.c_void_p]
+        lib.crfpp_parse.restype = ctypes.c_int
+        lib.crfpp_size.argtypes = [ctypes.c_void_p]
+        lib.crfpp_size.restype = ctypes.c_size_t
+        lib.crfpp_y2.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        lib.crfpp_y2.restype = ctypes.c_char_p
+        lib.crfpp_strerror.argtypes = [ctypes.c_void_p]
+        lib.crfpp_strerror.restype = ctypes.c_char_p
+        _library = lib
+    return _library or None
+
+
+def split_sequences(text):
+    """Split CRF++ input into sequences of rows the same way crf_test reads it"""
+    sequences = []
+    rows = []
+    for line in text.split("\n"):
+        if not line or line[0] in (" ", "\t"):
+            if rows:
+                sequences.append(rows)
+                rows = []
+            continue
+        rows.append(line)
+    if rows:
+        sequences.append(rows)
+    return sequences
+
+
+def format_result(rows, labels):
+    """Format labelled rows the same way crf_test prints them"""
+    output = []
+    for row, label in zip(rows, labels):
+        columns = [c for c in recolumn.split(row) if c]
+        output.append("\t".join(columns + [label]))
+    output.append("")
+    return "\n".join(output) + "\n"
+
+
+class CrfTagger:
+    """CRF++ model loaded once through libcrfpp.
+
+    The model is shared; every thread gets its own lightweight tagger on it.
+    """
+
+    def __init__(self, lib, model: str):
+        self._lib = lib
+        args = ["crf_test", "-m", model]
+        argv = (ctypes.c_char_p * len(args))(*(arg.encode("utf-8") for arg in args))
+        self._model = lib.crfpp_model_new(len(args), argv)
+        if not self._model:
+            message = lib.crfpp_model_strerror(None) or b""
+            raise RuntimeError(f"crf_test error: {message.decode('utf-8', 'replace')}")
+        self._local = threading.local()
+
+    def _tagger(self):
+        tagger = getattr(self._local, "tagger", None)
+        if tagger is None:
+            tagger = self._lib.crfpp_model_new_tagger(self._model)
+            if not tagger:
+                message = self._lib.crfpp_model_strerror(self._model) or b""
+                raise RuntimeError(f"crf_test error: {message.decode('utf-8', 'replace')}")
+            self._local.tagger = _TaggerHandle(self._lib, tagger)
+            tagger = self._local.tagger
+        return tagger.handle
+
+    def tag(self, rows: list[str]) -> list[str]:
+        """Label one sequence of rows (the columns abs2rel_text produces)"""
+        if not rows:
+            return []
+        lib = self._lib
+        tagger = self._tagger()
+        lib.crfpp_clear(tagger)
+        for row in rows:
+            if not lib.crfpp_add(tagger, row.encode("utf-8")):
+                raise RuntimeError(f"crf_test error: {lib.crfpp_strerror(tagger).decode('utf-8', 'replace')}")
+        if not lib.crfpp_parse(tagger):
+            raise RuntimeError(f"crf_test error: {lib.crfpp_strerror(tagger).decode('utf-8', 'replace')}")
+        return [lib.crfpp_y2(tagger, i).decode("utf-8") for i in range(lib.crfpp_size(tagger))]
+
+    def tag_batch(self, sequences: list[list[str]]) -> list[list[str]]:
+        """Label many sequences"""
+        return [self.tag(rows) for rows in sequences]
+
+    def parse(self, text: str) -> str:
+        """Label CRF++ input text, producing the same output as crf_test"""
+        return "".join(format_result(rows, self.tag(rows)) for rows in split_sequences(text))
+
+    def __del__(self):
+        model = getattr(self, "_model", None)
+        if model:
+            self._lib.crfpp_model_destroy(model)
+            self._model = None
+
+
+class _TaggerHandle:
+    """Owns a per-thread crfpp_t and frees it with the thread"""
+
+    def __init__(self, lib, handle):
+        self._lib = lib
+        self.handle = handle
+
+    def __del__(self):
+        if self.handle:
+            self._lib.crfpp_destroy(self.handle)
+            self.handle = None
+
+
+def get_tagger(model: str) -> CrfTagger | None:
+    """Return the shared tagger for the model, or None without libcrfpp"""
+    tagger = _taggers.get(model)
+    if tagger is not None:
+        return tagger
+
+    lib = load_library()
+    if lib is None:
+        return None
+
+    with _taggers_lock:
+        tagger = _taggers.get(model)
+        if tagger is None:
+            tagger = CrfTagger(lib, model)
+            _taggers[model] = tagger
+    return tagger
@@ -1,8 +1,15 @@
 #!/usr/bin/env python3
 
-import subprocess
+import argparse
+import json
+import os
+import time
+from itertools import repeat
+
 import Levenshtein
 
+from text2accent import process_text, warm_up
+
 # Test data: (input, expected_output) pairs
 # Output format is VOICEVOX-compatible (long vowels converted, punctuation handled)
 TEST_CASES = [
@@ -89,39 +96,236 @@ TEST_CASES = [
 ]
 
 
-def run_text2accent(input_text):
-    """Helper method to run text2accent.py with given input"""
-    result = subprocess.run(
-        ["./text2accent.py", "--mecab-dicdir", "/usr/src/app/unidic", "--mecab-userdic", "/usr/src/app/user.dic"],
-        input=input_text,
-        capture_output=True,
-        text=True,
-        encoding="utf-8"
+# Characters separating accent phrases in the output
+PHRASE_SEPARATORS = "/、？"
+
+
+def load_cases(path):
+    """Load (input, expected_output) pairs from a TSV or JSONL corpus file
+
+    TSV lines are "input<TAB>expected" (lines starting with # are skipped);
+    JSONL lines are objects with "text" and "expected".
+    """
+    cases = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            if path.endswith(".jsonl"):
+                case = json.loads(line)
+                cases.append((case["text"], case["expected"]))
+            else:
+                input_text, expected_output = line.split("\t")[:2]
+                cases.append((input_text, expected_output))
+    return cases
+
+
+def parse_accent(accent):
+    """Split accent output into morae with flags for a nucleus and a phrase boundary after them"""
+    kana = []
+    nucleus = []
+    boundary = []
+    for ch in accent:
+        if ch == "'":
+            if nucleus:
+                nucleus[-1] = True
+        elif ch in PHRASE_SEPARATORS:
+            if boundary:
+                boundary[-1] = True
+        else:
+            kana.append(ch)
+            nucleus.append(False)
+            boundary.append(False)
+    # The end of the text is not a boundary to predict
+    if boundary:
+        boundary[-1] = False
+    return "".join(kana), nucleus, boundary
+
+
+def phrases_of(nucleus, boundary):
+    """Return the accent phrases as (start, end, nucleus positions)"""
+    phrases = []
+    start = 0
+    for i, is_boundary in enumerate(boundary):
+        if is_boundary or i == len(boundary) - 1:
+            phrases.append((start, i + 1, tuple(j for j in range(start, i + 1) if nucleus[j])))
+            start = i + 1
+    return phrases
+
+
+def compare_accent(actual_output, expected_output):
+    """Count matching boundaries, nuclei and phrases between two accent outputs
+
+    Morae are aligned by their kana, so flags are compared only on morae
+    present in both.
+    """
+    actual_kana, actual_nucleus, actual_boundary = parse_accent(actual_output)
+    expected_kana, expected_nucleus, expected_boundary = parse_accent(expected_output)
+
+    # Expected mora position -> actual mora position
+    aligned = {}
+    for tag, i1, i2, j1, j2 in Levenshtein.opcodes(expected_kana, actual_kana):
+        if tag == "equal":
+            for k in range(i2 - i1):
+                aligned[i1 + k] = j1 + k
+
+    counts = {
+        "boundary_expected": sum(expected_boundary),
+        "boundary_actual": sum(actual_boundary),
+        "boundary_correct": sum(
+            1 for i, j in aligned.items() if expected_boundary[i] and actual_boundary[j]
+        ),
+        "nucleus_expected": sum(expected_nucleus),
+        "nucleus_actual": sum(actual_nucleus),
+        "nucleus_correct": sum(
+            1 for i, j in aligned.items() if expected_nucleus[i] and actual_nucleus[j]
+        ),
+    }
+
+    # A phrase is correct if its span and nucleus are reproduced exactly
+    actual_phrases = set(phrases_of(actual_nucleus, actual_boundary))
+    expected_phrases = phrases_of(expected_nucleus, expected_boundary)
+    counts["phrase_expected"] = len(expected_phrases)
+    counts["phrase_correct"] = 0
+    for start, end, nuclei in expected_phrases:
+        if all(i in aligned for i in range(start, end)):
+            mapped = (aligned[start], aligned[end - 1] + 1, tuple(aligned[i] for i in nuclei))
+            if aligned[end - 1] - aligned[start] == end - 1 - start and mapped in actual_phrases:
+                counts["phrase_correct"] += 1
+    return counts
+
+
+def f1_scores(correct, expected, actual):
+    precision = correct / actual if actual else 0.0
+    recall = correct / expected if expected else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def run_case(input_text, mecab_dicdir, mecab_userdic):
+    """Process one case, returning the output or the error message"""
+    try:
+        return process_text(input_text, mecab_dicdir, mecab_userdic)
+    except Exception as e:
+        return f"ERROR: {e}"
+
+
+def run_cases(cases, mecab_dicdir, mecab_userdic, jobs):
+    """Process the inputs of all cases, in order, on jobs worker processes"""
+    inputs = [input_text for input_text, _ in cases]
+    if jobs <= 1:
+        return [run_case(input_text, mecab_dicdir, mecab_userdic) for input_text in inputs]
+
+    from parallel import get_pool
+
+    pool = get_pool(jobs, mecab_dicdir, mecab_userdic)
+    return list(
+        pool.map(
+            run_case,
+            inputs,
+            repeat(mecab_dicdir),
+            repeat(mecab_userdic),
+            chunksize=max(1, len(inputs) // (jobs * 4)),
+        )
     )
-    return result.stdout.strip()
 
 
-def eval_case(input_text, expected_output, index):
-    actual_output = run_text2accent(input_text)
+def eval_case(input_text, expected_output, actual_output, index, verbose=True):
     distance = Levenshtein.distance(
         actual_output,
         expected_output
     )
-    print(f"Test case {index}: {distance} edits")
-    print(f"Actual  : {actual_output}")
-    print(f"Expected: {expected_output}")
+    if verbose:
+        print(f"Test case {index}: {distance} edits")
+        print(f"Actual  : {actual_output}")
+        print(f"Expected: {expected_output}")
     return distance
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate accent estimation accuracy and throughput")
+    parser.add_argument(
+        "corpus",
+        nargs="*",
+        help="TSV or JSONL corpus files (default: built-in test cases)",
+    )
+    parser.add_argument(
+        "--mecab-dicdir",
+        default=os.environ.get("MECAB_DICDIR", "/usr/src/app/unidic"),
+        help="MeCab dictionary directory",
+    )
+    parser.add_argument(
+        "--mecab-userdic",
+        default=os.environ.get("MECAB_USERDIC", "/usr/src/app/user.dic"),
+        help="MeCab user dictionary path (empty to disable)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes to spread the cases across",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print the summary")
+    parser.add_argument("--json", help="Write the summary as JSON to this file")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    mecab_userdic = args.mecab_userdic if args.mecab_userdic else None
+
+    cases = []
+    for path in args.corpus:
+        cases.extend(load_cases(path))
+    if not args.corpus:
+        cases = TEST_CASES
+
+    # Engines are loaded and worker processes started before the clock starts
+    if args.jobs > 1:
+        from parallel import get_pool, start_workers
+
+        start_workers(get_pool(args.jobs, args.mecab_dicdir, mecab_userdic), args.jobs)
+    else:
+        warm_up(args.mecab_dicdir, mecab_userdic)
+
+    start_time = time.perf_counter()
+    outputs = run_cases(cases, args.mecab_dicdir, mecab_userdic, args.jobs)
+    wall_time = time.perf_counter() - start_time
+
     total_distance = 0
+    exact = 0
+    counts = {}
+    for i, ((input_text, expected_output), actual_output) in enumerate(zip(cases, outputs), 1):
+        total_distance += eval_case(input_text, expected_output, actual_output, i, not args.quiet)
+        exact += actual_output == expected_output
+        for key, value in compare_accent(actual_output, expected_output).items():
+            counts[key] = counts.get(key, 0) + value
 
-    # Dynamically add test methods for each test case
-    for i, (input_text, expected_output) in enumerate(TEST_CASES, 1):
-        d = eval_case(input_text, expected_output, i)
-        total_distance += d
+    summary = {
+        "cases": len(cases),
+        "total_edit_distance": total_distance,
+        "mean_edit_distance": total_distance / len(cases) if cases else 0.0,
+        "exact_match": exact / len(cases) if cases else 0.0,
+        "boundary": f1_scores(counts.get("boundary_correct", 0), counts.get("boundary_expected", 0), counts.get("boundary_actual", 0)),
+        "nucleus": f1_scores(counts.get("nucleus_correct", 0), counts.get("nucleus_expected", 0), counts.get("nucleus_actual", 0)),
+        "phrase_accuracy": counts["phrase_correct"] / counts["phrase_expected"] if counts.get("phrase_expected") else 0.0,
+        "jobs": args.jobs,
+        "wall_time": wall_time,
+        "sentences_per_sec": len(cases) / wall_time if wall_time else 0.0,
+    }
 
     print(f"Total edit distance for all test cases: {total_distance}")
+    print(f"Exact match: {summary['exact_match']:.1%}")
+    print(f"Boundary P/R/F1: {summary['boundary']['precision']:.3f} / {summary['boundary']['recall']:.3f} / {summary['boundary']['f1']:.3f}")
+    print(f"Nucleus P/R/F1: {summary['nucleus']['precision']:.3f} / {summary['nucleus']['recall']:.3f} / {summary['nucleus']['f1']:.3f}")
+    print(f"Phrase accuracy: {summary['phrase_accuracy']:.1%}")
+    print(f"Wall time: {wall_time:.2f}s ({summary['sentences_per_sec']:.1f} sentences/sec, {args.jobs} jobs)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Raised when a BoundedExecutor has no room for another task"""
+
+
+class BoundedExecutor:
+    """Thread pool running blocking work for the event loop, with a bounded queue.
+
+    At most max_workers tasks run at once and at most max_queue more wait for
+    a thread; submitting beyond that raises QueueFull instead of piling up.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="accent")
+        self._lock = threading.Lock()
+        self._pending = 0  # submitted and not finished
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args) -> Future:
+        """Schedule fn(*args) on the pool, or raise QueueFull"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise QueueFull(f"{self._pending} tasks pending")
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._run, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is freed when the task finishes, and also when it is
+        # cancelled while still queued (its caller went away), which _run
+        # never sees
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future | None = None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool and wait for its result without blocking the event loop
+
+        Cancelling the wait cancels the task if it has not started yet.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def _run(self, fn, *args):
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        """Return the limits, queue depth and counters of the pool"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queued": self._pending - self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
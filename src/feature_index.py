@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import zlib
+from operator import attrgetter
+
+DEFAULT_FEATURE_INDEX = "feature_index.bin"
+
+# File layout: header, open addressing table of record offsets, records of
+# key and value strings joined by SEPARATOR. Lookups read the file through
+# mmap, so processes share its pages instead of each holding a copy.
+MAGIC = b"ACFI"
+FORMAT_VERSION = 3
+# magic, version, slots, entries, code hash, dictionary hash, dictionary stat key
+HEADER = struct.Struct("<4sIII32s32s32s")
+SLOT = struct.Struct("<I")
+RECORD = struct.Struct("<HH")  # key and value sizes
+EMPTY = 0xFFFFFFFF
+SEPARATOR = "\x1f"
+
+# Modules lexeme_features depends on: an index built by other code is ignored
+CODE_FILES = ("mkdata_accent.py", "mora.py", "accent_types.py")
+
+# Compiled MeCab dictionary header (dictionary.cpp): magic, version, type,
+# lexsize, lsize, rsize, dsize, tsize, fsize, dummy, then the charset
+MECAB_HEADER = struct.Struct("<10I32s")
+
+# Seikei fields the lexeme features of mkdata_accent depend on
+lexeme_key = attrgetter("orth", "pron", "pos", "aType", "aConType", "aModType")
+
+# Loaded index (None: not loaded yet)
+_index = None
+
+
+def code_hash() -> bytes:
+    """Hash of the code computing lexeme features"""
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_FILES:
+        with open(os.path.join(directory, name), "rb") as f:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def dictionary_paths(paths) -> list[str]:
+    """Expand dictionary directories to their sys.dic, failing on anything else"""
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            path = os.path.join(path, "sys.dic")
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"no compiled MeCab dictionary: {path}")
+        result.append(path)
+    return result
+
+
+def dictionary_hash(paths) -> bytes:
+    """Hash of the contents of compiled dictionaries (directories or .dic files)"""
+    digest = hashlib.sha256()
+    for path in dictionary_paths(paths):
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+    return digest.digest()
+
+
+def dictionary_stat_key(paths) -> bytes:
+    """Hash of the sizes and modification times of compiled dictionaries
+
+    Cheap to compute, so the contents are only hashed again when it changes.
+    """
+    digest = hashlib.sha256()
+    for path in dictionary_paths(paths):
+        stat = os.stat(path)
+        digest.update(struct.pack("<QQ", stat.st_size, stat.st_mtime_ns))
+    return digest.digest()
+
+
+def read_dictionary_features(path: str):
+    """Yield the CSV features of every entry of a compiled MeCab dictionary (.dic)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    header = MECAB_HEADER.unpack_from(data, 0)
+    dsize, tsize, fsize = header[6:9]
+    charset = header[10].split(b"\0", 1)[0].decode("ascii").lower()
+    if charset.replace("-", "") != "utf8":
+        raise ValueError(f"unsupported dictionary charset {charset}: {path}")
+    start = MECAB_HEADER.size + dsize + tsize
+    features = data[start:start + fsize]
+    if len(features) != fsize:
+        raise ValueError(f"dictionary is broken: {path}")
+    for feature in features.split(b"\0"):
+        if feature:
+            yield feature.decode("utf-8")
+
+
+def build_feature_index(paths) -> dict:
+    """Compute the lexeme features of every entry of compiled MeCab dictionaries"""
+    from mkdata_accent import lexeme_features
+    from text2accent import seikei_morpheme, split_features
+
+    features = {}
+    for path in dictionary_paths(paths):
+        for feature in read_dictionary_features(path):
+            morpheme = seikei_morpheme("", split_features(feature), "/")
+            if morpheme is None or morpheme.pron == "*":
+                continue
+
+            key = lexeme_key(morpheme)
+            if key in features:
+                continue
+            try:
+                features[key] = lexeme_features(*key)
+            except (IndexError, ValueError):
+                # Left to mkdata_accent, which fails on it the same way
+                continue
+    return features
+
+
+def write_feature_index(path: str, features: dict, dictionary: bytes, dictionary_stat: bytes) -> None:
+    """Write features (key tuple -> value tuple) as an index file"""
+    nslots = 1
+    while nslots < len(features) * 2:
+        nslots *= 2
+    slots = [EMPTY] * nslots
+    records = bytearray()
+    for key, value in features.items():
+        key_bytes = SEPARATOR.join(key).encode("utf-8")
+        value_bytes = SEPARATOR.join(value).encode("utf-8")
+        slot = zlib.crc32(key_bytes) & (nslots - 1)
+        while slots[slot] != EMPTY:
+            slot = (slot + 1) & (nslots - 1)
+        slots[slot] = len(records)
+        records += RECORD.pack(len(key_bytes), len(value_bytes)) + key_bytes + value_bytes
+    if len(records) >= EMPTY:
+        raise ValueError("feature index too large")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, nslots, len(features), code_hash(), dictionary, dictionary_stat))
+        f.write(struct.pack(f"<{nslots}I", *slots))
+        f.write(records)
+    os.replace(tmp_path, path)
+
+
+class FeatureIndex:
+    """Read-only lexeme feature index mapped from a file written by write_feature_index"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            raise ValueError(f"feature index is broken: {path}")
+        (
+            magic, version, nslots, self.entries, self.code, self.dictionary, self.dictionary_stat
+        ) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"unsupported feature index format: {path}")
+        if self.code != code_hash():
+            raise ValueError(f"feature index built by other code than lexeme_features: {path}")
+        self._mask = nslots - 1
+        self._records = HEADER.size + SLOT.size * nslots
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def get(self, key):
+        """Return the features of a lexeme key, or None"""
+        key_bytes = SEPARATOR.join(key).encode("utf-8")
+        data = self._mmap
+        slot = zlib.crc32(key_bytes) & self._mask
+        while True:
+            (offset,) = SLOT.unpack_from(data, HEADER.size + SLOT.size * slot)
+            if offset == EMPTY:
+                return None
+            start = self._records + offset
+            key_size, value_size = RECORD.unpack_from(data, start)
+            start += RECORD.size
+            if data[start:start + key_size] == key_bytes:
+                start += key_size
+                return tuple(data[start:start + value_size].decode("utf-8").split(SEPARATOR))
+            slot = (slot + 1) & self._mask
+
+
+def get_feature_index():
+    """Return the index at FEATURE_INDEX opened once per process, or an empty one
+
+    An index written for other code than the current lexeme_features is
+    ignored with a warning. Features depend only on the lexeme key, so an
+    index built from another dictionary gives the same results, but finds
+    fewer words (see check_feature_index).
+    """
+    global _index
+    if _index is None:
+        path = os.environ.get("FEATURE_INDEX", DEFAULT_FEATURE_INDEX)
+        try:
+            _index = FeatureIndex(path)
+        except FileNotFoundError:
+            _index = {}
+        except ValueError as e:
+            print(f"feature index ignored: {e}", file=sys.stderr)
+            _index = {}
+    return _index
+
+
+def check_feature_index(mecab_dicdir: str, mecab_userdic: str | None) -> None:
+    """Ignore the index with a warning unless it was built from these dictionaries
+
+    The dictionaries are only hashed when their sizes or modification times
+    differ from those the index was built from, so processes starting with an
+    unchanged image do not read the whole of sys.dic.
+    """
+    global _index
+    index = get_feature_index()
+    if not isinstance(index, FeatureIndex):
+        return
+    paths = [mecab_dicdir] + ([mecab_userdic] if mecab_userdic else [])
+    try:
+        if dictionary_stat_key(paths) == index.dictionary_stat:
+            return
+        dictionary = dictionary_hash(paths)
+    except OSError:
+        dictionary = None
+    if dictionary != index.dictionary:
+        print("feature index ignored: built from other dictionaries than " + " ".join(paths), file=sys.stderr)
+        _index = {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the lexeme feature index used by mkdata_accent")
+    parser.add_argument(
+        "dictionaries",
+        nargs="+",
+        help="Compiled MeCab dictionaries: directories containing sys.dic, or .dic files (user dictionaries)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=DEFAULT_FEATURE_INDEX,
+        help="Output index path",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        features = build_feature_index(args.dictionaries)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not features:
+        parser.error("no dictionary entries with pronunciation found")
+    write_feature_index(args.output, features, dictionary_hash(args.dictionaries), dictionary_stat_key(args.dictionaries))
+    print(f"{len(features)} entries written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,13 @@
 import sys
 from optparse import OptionParser
 
+from mora import pair_moras
+from morpheme import Morpheme
+
 usage = u"""usage: %prog resultfile
 Format accent output with / for phrase boundaries and ' for accent nucleus
 """
 
-# それ自身ではモーラ数にカウントされない読み一覧
-nonMoraList = set(u"ァ ィ ゥ ェ ォ ャ ュ ョ".split())
-
 def format_phrase(phrase_data):
     """アクセント句をフォーマット"""
     result = []
@@ -24,17 +24,7 @@ def format_phrase(phrase_data):
         accent = morph['accent']
 
         # 発音形をモーラに分解してモーラ数を数える
-        mora_list_temp = []
-        i = 0
-        while i < len(pron):
-            if i + 1 < len(pron) and pron[i + 1] in nonMoraList:
-                mora_list_temp.append(pron[i] + pron[i + 1])
-                i += 2
-            else:
-                mora_list_temp.append(pron[i])
-                i += 1
-
-        morph_mora_count = len(mora_list_temp)
+        morph_mora_count = len(pair_moras(pron))
 
         # アクセント核の位置を計算（アクセント句全体での位置）
         if accent > 0:
@@ -48,15 +38,7 @@ def format_phrase(phrase_data):
         pron = morph['pron']
 
         # 発音形をモーラに分解
-        mora_list = []
-        i = 0
-        while i < len(pron):
-            if i + 1 < len(pron) and pron[i + 1] in nonMoraList:
-                mora_list.append(pron[i] + pron[i + 1])
-                i += 2
-            else:
-                mora_list.append(pron[i])
-                i += 1
+        mora_list = pair_moras(pron)
 
         # モーラを追加
         for mora in mora_list:
@@ -74,7 +56,8 @@ def format_phrase(phrase_data):
     result.append("/")
     return "".join(result)
 
-def format_accent_text(text):
+def format_accent_records(morphemes):
+    """推定アクセント型（labels の最後）を付けた形態素の列をフォーマット"""
     auxiliary_keep_boundary = {"ー"}
 
     # バッファに1アクセント句を保存
@@ -109,18 +92,10 @@ def format_accent_text(text):
             output_parts.extend(separators)
         phrase_buffer = []
 
-    for line in text.splitlines():
-        if len(line.strip()) == 0:
-            # 空行は無視（EOFまで1つの文として処理）
-            continue
-
-        features = line.split()
-        if len(features) < 36:
-            continue
-
-        orth = features[0]  # 書字形
-        pron = features[1]  # 発音形
-        boundary_flag = features[12]  # 文節境界フラグ（/か-）
+    for morph in morphemes:
+        orth = morph.orth  # 書字形
+        pron = morph.pron  # 発音形
+        boundary_flag = morph.bunsetsu  # 文節境界フラグ（/か-）
 
         # pron == "*" の場合は補助記号（、など）
         if pron == "*":
@@ -131,11 +106,11 @@ def format_accent_text(text):
                 flush_phrase_buffer()
             continue
 
-        nmora = int(features[13])  # モーラ数
+        nmora = int(morph.nmora)  # モーラ数
 
         # 最後の列が推定アクセント型
         try:
-            accent_pos = int(features[-1])
+            accent_pos = int(morph.labels[-1])
         except ValueError:
             # 数値に変換できない場合は0（平板型）として扱う
             accent_pos = 0
@@ -170,6 +145,22 @@ def format_accent_text(text):
     return ""
 
 
+def format_accent_text(text):
+    morphemes = []
+    for line in text.splitlines():
+        if len(line.strip()) == 0:
+            # 空行は無視（EOFまで1つの文として処理）
+            continue
+
+        features = line.split()
+        if len(features) < 36:
+            continue
+
+        morphemes.append(Morpheme.from_columns(features))
+
+    return format_accent_records(morphemes)
+
+
 def main(argv=None):
     parser = OptionParser(usage=usage)
     (options, args) = parser.parse_args(argv)
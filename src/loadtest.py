@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPORA = [
+    os.path.join(BENCH_DIR, "bench_corpus", "short.txt"),
+    os.path.join(BENCH_DIR, "bench_corpus", "medium.txt"),
+]
+
+
+class HTTPConnection:
+    """Minimal HTTP/1.1 keep-alive client connection on asyncio streams"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self) -> None:
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method: str, path: str, body: bytes = b"") -> tuple[int, bytes, bool]:
+        """Send a request and return the status, body and whether the connection can be reused"""
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n"
+        )
+        self.writer.write(head.encode("ascii") + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            content = b"".join(chunks)
+        else:
+            content = await self.reader.readexactly(int(headers.get("content-length", "0")))
+        return status, content, headers.get("connection", "").lower() != "close"
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ConnectionPool:
+    """Keep-alive connections reused by the load generator"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._idle = []
+
+    async def request(self, method: str, path: str, body: bytes = b"") -> tuple[int, bytes]:
+        connection = self._idle.pop() if self._idle else None
+        try:
+            if connection is None:
+                raise ConnectionError("no idle connection")
+            status, content, reusable = await connection.request(method, path, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # The server may have closed an idle connection; retry on a new one
+            if connection is not None:
+                connection.close()
+            connection = HTTPConnection(self.host, self.port)
+            await connection.open()
+            try:
+                status, content, reusable = await connection.request(method, path, body)
+            except BaseException:
+                connection.close()
+                raise
+        except BaseException:
+            connection.close()
+            raise
+        if reusable:
+            self._idle.append(connection)
+        else:
+            connection.close()
+        return status, content
+
+    def close(self) -> None:
+        for connection in self._idle:
+            connection.close()
+        self._idle.clear()
+
+
+def load_texts(paths) -> list[str]:
+    texts = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            texts.extend(line.strip() for line in f if line.strip())
+    return texts
+
+
+def request_bodies(texts, batch_size: int, seed: int):
+    """Yield request bodies cycling through the texts in a seeded order"""
+    rng = random.Random(seed)
+    order = list(texts)
+    while True:
+        rng.shuffle(order)
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            if batch_size > 1:
+                yield json.dumps({"texts": chunk}, ensure_ascii=False).encode("utf-8")
+            else:
+                yield json.dumps({"text": chunk[0]}, ensure_ascii=False).encode("utf-8")
+
+
+def percentile(sorted_values: list[float], p: float) -> float | None:
+    """Percentile by linear interpolation between closest ranks"""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+class Recorder:
+    """Latencies and outcomes of the requests completed during a step
+
+    Latencies are kept per HTTP status: fast 503 rejections would otherwise
+    pull the latency of an overloaded server down.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = 0
+
+    async def send(self, pool: ConnectionPool, path: str, body: bytes) -> None:
+        start = time.perf_counter()
+        try:
+            status, _ = await pool.request("POST", path, body)
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            self.errors += 1
+            self.statuses[type(e).__name__] = self.statuses.get(type(e).__name__, 0) + 1
+            return
+        self.latencies.setdefault(str(status), []).append(time.perf_counter() - start)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if status != 200:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> dict:
+        total = sum(self.statuses.values())
+        ok = total - self.errors
+        return {
+            "requests": total,
+            "errors": self.errors,
+            "error_rate": self.errors / total if total else 0.0,
+            "statuses": self.statuses,
+            "elapsed": elapsed,
+            "throughput": ok / elapsed if elapsed else 0.0,
+            # Latency of the successful requests
+            "latency": summarize_latencies(self.latencies.get("200", [])),
+            "latency_by_status": {
+                status: summarize_latencies(latencies) for status, latencies in sorted(self.latencies.items())
+            },
+        }
+
+
+def summarize_latencies(latencies: list[float]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "mean": statistics.fmean(latencies) if latencies else None,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else None,
+    }
+
+
+async def closed_loop(pool, path, bodies, concurrency: int, duration: float) -> dict:
+    """Keep concurrency requests in flight for duration seconds"""
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            await recorder.send(pool, path, next(bodies))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return recorder.summary(time.perf_counter() - start)
+
+
+async def open_loop(pool, path, bodies, rate: float, duration: float, rng: random.Random) -> dict:
+    """Send requests at Poisson arrivals of rate per second for duration seconds"""
+    recorder = Recorder()
+    tasks = []
+    start = time.perf_counter()
+    arrival = start
+    while True:
+        arrival += rng.expovariate(rate)
+        if arrival - start >= duration:
+            break
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(recorder.send(pool, path, next(bodies))))
+    await asyncio.gather(*tasks)
+    return recorder.summary(time.perf_counter() - start)
+
+
+def find_knee(steps: list[dict]) -> dict | None:
+    """Return the step with the highest power (throughput / p95 latency).
+
+    Both count successful requests only, so a step where the server sheds
+    load with 503 is not mistaken for a fast one. Past this point added load
+    buys less throughput than it costs in latency.
+    """
+    candidates = [step for step in steps if step["latency"]["p95"] and step["throughput"]]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda step: step["throughput"] / step["latency"]["p95"])
+
+
+def start_server(args) -> tuple[str, int]:
+    """Run server:app with uvicorn in a background thread on a local port"""
+    import uvicorn
+
+    import server
+    from text2accent import phrase_memo
+
+    # Keep the request log and the result cache out of the measurement
+    logging.getLogger("server").setLevel(logging.WARNING)
+    if not args.cache:
+        server.result_cache.max_entries = 0
+    if not args.memo:
+        phrase_memo.max_entries = 0
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", args.port))
+    host, port = sock.getsockname()
+    config = uvicorn.Config(server.app, log_level="warning", access_log=False)
+    uvicorn_server = uvicorn.Server(config)
+    threading.Thread(target=uvicorn_server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    return host, port
+
+
+async def wait_ready(pool: ConnectionPool, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            status, _ = await pool.request("GET", "/ready")
+            if status == 200:
+                return
+        except OSError:
+            pass
+        if time.perf_counter() > deadline:
+            raise TimeoutError("server did not become ready")
+        await asyncio.sleep(0.2)
+
+
+def parse_loads(value: str) -> list[float]:
+    return [float(load) for load in value.split(",") if load]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the accent API and find its saturation point")
+    parser.add_argument("--url", help="Base URL of a running server (default: start server:app in-process)")
+    parser.add_argument("--port", type=int, default=0, help="Port for the in-process server (default: any free port)")
+    parser.add_argument("--corpus", action="append", help="Text files with one text per line (default: bench_corpus short and medium)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Texts per request (>1 posts to /accent/batch)")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="Closed loop: comma-separated concurrency steps")
+    parser.add_argument("--rate", help="Open loop: comma-separated arrival rates (requests/sec) instead of concurrency")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per step")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of unmeasured load before the steps")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the text order and arrivals")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache of the in-process server enabled")
+    parser.add_argument("--no-memo", dest="memo", action="store_false", help="Disable the phrase memo of the in-process server")
+    parser.add_argument("-o", "--output", help="Write results as JSON to this file (default: stdout)")
+    return parser.parse_args(argv)
+
+
+async def run(args) -> dict:
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+        prefix = url.path.rstrip("/")
+    else:
+        host, port = start_server(args)
+        prefix = ""
+    path = prefix + ("/accent/batch" if args.batch_size > 1 else "/accent")
+
+    pool = ConnectionPool(host, port)
+    await wait_ready(pool, timeout=120)
+
+    texts = load_texts(args.corpus or DEFAULT_CORPORA)
+    bodies = request_bodies(texts, args.batch_size, args.seed)
+    rng = random.Random(args.seed)
+
+    if args.rate:
+        mode, loads = "open", parse_loads(args.rate)
+    else:
+        mode, loads = "closed", [int(load) for load in parse_loads(args.concurrency)]
+
+    if args.warmup > 0:
+        await closed_loop(pool, path, bodies, int(max(loads)) if mode == "closed" else 1, args.warmup)
+
+    steps = []
+    for load in loads:
+        if mode == "closed":
+            step = await closed_loop(pool, path, bodies, load, args.duration)
+            step["concurrency"] = load
+        else:
+            step = await open_loop(pool, path, bodies, load, args.duration, rng)
+            step["rate"] = load
+        steps.append(step)
+        print(
+            f"{mode} {load}: {step['throughput']:.1f} req/s, p95 "
+            f"{(step['latency']['p95'] or 0) * 1000:.1f} ms, errors {step['error_rate']:.1%}",
+            file=sys.stderr,
+        )
+    pool.close()
+
+    knee = find_knee(steps)
+    return {
+        "config": {
+            "url": args.url or "in-process",
+            "path": path,
+            "mode": mode,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "batch_size": args.batch_size,
+            "texts": len(texts),
+            "cache": args.cache if not args.url else None,
+            "memo": args.memo if not args.url else None,
+        },
+        "steps": steps,
+        "knee": {key: knee[key] for key in ("concurrency", "rate") if key in knee} if knee else None,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import ctypes
+import ctypes.util
+import os
+import threading
+
+DEFAULT_MECAB_LIBRARY = "/usr/local/lib/libmecab.so"
+
+# libmecab handle (None: not loaded yet, False: unavailable)
+_library = None
+_taggers = {}
+_taggers_lock = threading.Lock()
+
+
+def load_library():
+    """Load libmecab once per process, or return None if it is unavailable"""
+    global _library
+    if _library is None:
+        path = os.environ.get("MECAB_LIBRARY", DEFAULT_MECAB_LIBRARY)
+        if not os.path.exists(path):
+            path = ctypes.util.find_library("mecab")
+        try:
+            if path is None:
+                raise OSError("libmecab not found")
+            lib = ctypes.CDLL(path)
+        except OSError:
+            _library = False
+            return None
+
+        lib.mecab_new.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_char_p)]
+        lib.mecab_new.restype = ctypes.c_void_p
+        lib.mecab_sparse_tostr2.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t]
+        lib.mecab_sparse_tostr2.restype = ctypes.c_char_p
+        lib.mecab_strerror.argtypes = [ctypes.c_void_p]
+        lib.mecab_strerror.restype = ctypes.c_char_p
+        lib.mecab_destroy.argtypes = [ctypes.c_void_p]
+        lib.mecab_destroy.restype = None
+        _library = lib
+    return _library or None
+
+
+class MecabTagger:
+    """Long-lived MeCab tagger loaded through libmecab.
+
+    The dictionaries are loaded once when the tagger is created. options are
+    passed on as mecab command line options (e.g. output formats). A tagger
+    keeps its output buffer internally, so calls are serialized with a lock.
+    """
+
+    def __init__(self, lib, mecab_dicdir: str, mecab_userdic: str | None = None, options: tuple = ()):
+        self._lib = lib
+        args = ["mecab", f"--dicdir={mecab_dicdir}"]
+        if mecab_userdic:
+            args.append(f"--userdic={mecab_userdic}")
+        args.extend(options)
+        argv = (ctypes.c_char_p * len(args))(*(arg.encode("utf-8") for arg in args))
+        self._mecab = lib.mecab_new(len(args), argv)
+        if not self._mecab:
+            message = lib.mecab_strerror(None) or b""
+            raise RuntimeError(f"mecab error: {message.decode('utf-8', 'replace')}")
+        self._lock = threading.Lock()
+
+    def parse(self, text: str, fallback=None) -> str:
+        """Analyze text line by line, producing the same output as the mecab command
+
+        With fallback, a line MeCab fails on is given to fallback(line) for its
+        output instead of raising.
+        """
+        if not text:
+            return ""
+        lines = text.split("\n")
+        if text.endswith("\n"):
+            lines.pop()
+
+        output = []
+        with self._lock:
+            for line in lines:
+                data = line.encode("utf-8")
+                result = self._lib.mecab_sparse_tostr2(self._mecab, data, len(data))
+                if result is None:
+                    if fallback is not None:
+                        output.append(fallback(line))
+                        continue
+                    message = self._lib.mecab_strerror(self._mecab) or b""
+                    raise RuntimeError(f"mecab error: {message.decode('utf-8', 'replace')}")
+                output.append(result.decode("utf-8"))
+        return "".join(output)
+
+    def __del__(self):
+        mecab = getattr(self, "_mecab", None)
+        if mecab:
+            self._lib.mecab_destroy(mecab)
+            self._mecab = None
+
+
+def get_tagger(mecab_dicdir: str, mecab_userdic: str | None, options: tuple = ()) -> MecabTagger | None:
+    """Return the shared tagger for the dictionaries and options, or None without libmecab"""
+    key = (mecab_dicdir, mecab_userdic or None, tuple(options))
+    tagger = _taggers.get(key)
+    if tagger is not None:
+        return tagger
+
+    lib = load_library()
+    if lib is None:
+        return None
+
+    with _taggers_lock:
+        tagger = _taggers.get(key)
+        if tagger is None:
+            tagger = MecabTagger(lib, mecab_dicdir, mecab_userdic, options)
+            _taggers[key] = tagger
+    return tagger
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from time import perf_counter
+
+# Pipeline stages timed by text2accent
+STAGES = (
+    "segmentation",
+    "mecab",
+    "mkdata_accent",
+    "rule",
+    "abs2rel",
+    "crf",
+    "rel2abs",
+    "format_accent",
+    "normalize",
+)
+
+# Stages take from tens of microseconds to seconds
+STAGE_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Seconds between the snapshots written by each process in multiprocess mode
+SNAPSHOT_INTERVAL = 1.0
+
+_metrics = []
+# Directory the processes of a prefork server share metrics through (None: this process only)
+_multiprocess_dir = None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base of the metrics exposed in Prometheus text format.
+
+    Values are kept per tuple of label values, given in the order of
+    labelnames. In multiprocess mode, the values of all processes are added
+    up, and with live_only only those of processes still running.
+    """
+
+    type = ""
+    live_only = False
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def values(self) -> list:
+        """Return (label values, value) of each sample of this process"""
+        with self._lock:
+            return list(self._values.items())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def add(value, other):
+        return value + other
+
+    def samples(self, values):
+        """Yield (suffix, label values, extra label, value) of each sample"""
+        for labels, value in values:
+            yield "", labels, "", value
+
+    def render(self, values=None) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, labels, extra, value in self.samples(self.values() if values is None else values):
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, labels: tuple = ()) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Gauge whose value is read from a function at exposition time"""
+
+    type = "gauge"
+    live_only = True
+
+    def __init__(self, name: str, documentation: str, function):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def values(self) -> list:
+        return [((), self.function())]
+
+
+class FunctionCounter(Gauge):
+    """Counter whose value is read from a function at exposition time"""
+
+    type = "counter"
+    live_only = False
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Non-cumulative bucket counts (the last one for +Inf), sum
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def values(self) -> list:
+        with self._lock:
+            return [(labels, (list(counts), total)) for labels, (counts, total) in self._values.items()]
+
+    @staticmethod
+    def add(value, other):
+        return [a + b for a, b in zip(value[0], other[0])], value[1] + other[1]
+
+    def samples(self, values):
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", labels, f'le="{_format_value(float(bound))}"', cumulative
+            yield "_sum", labels, "", total
+            yield "_count", labels, "", cumulative
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_snapshot() -> None:
+    """Write the values of this process to the multiprocess directory"""
+    if _multiprocess_dir is None:
+        return
+    data = {metric.name: [[list(labels), value] for labels, value in metric.values()] for metric in _metrics}
+    path = os.path.join(_multiprocess_dir, f"{os.getpid()}.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def _write_snapshots() -> None:
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL)
+        try:
+            write_snapshot()
+        except OSError:
+            pass
+
+
+def enable_multiprocess(directory: str) -> None:
+    """Share the metrics of this process with the others writing to directory.
+
+    Values inherited from the parent are cleared, and a snapshot of them is
+    written every SNAPSHOT_INTERVAL seconds. Snapshots of processes that
+    exited are kept, so counters do not go back when a worker is replaced.
+    """
+    global _multiprocess_dir
+    for metric in _metrics:
+        metric.reset()
+    _multiprocess_dir = directory
+    write_snapshot()
+    threading.Thread(target=_write_snapshots, name="metrics-snapshot", daemon=True).start()
+
+
+def _merged_values() -> dict:
+    """Return the values of all processes by metric name, added up"""
+    write_snapshot()
+    merged = {metric.name: {} for metric in _metrics}
+    for path in glob.glob(os.path.join(_multiprocess_dir, "*.json")):
+        pid = int(os.path.basename(path).split(".")[0])
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = None
+        for metric in _metrics:
+            if metric.live_only:
+                if alive is None:
+                    alive = _process_alive(pid)
+                if not alive:
+                    continue
+            values = merged[metric.name]
+            for labels, value in data.get(metric.name, ()):
+                labels = tuple(labels)
+                values[labels] = metric.add(values[labels], value) if labels in values else value
+    return merged
+
+
+def render() -> str:
+    """Return every metric in Prometheus text exposition format, of all processes in multiprocess mode"""
+    if _multiprocess_dir is None:
+        return "".join(metric.render() for metric in _metrics)
+    merged = _merged_values()
+    return "".join(metric.render(list(merged[metric.name].items())) for metric in _metrics)
+
+
+stage_seconds = Histogram(
+    "accent_stage_duration_seconds",
+    "Time spent in each pipeline stage per text",
+    ("stage",),
+    STAGE_BUCKETS,
+)
+batch_stage_seconds = Histogram(
+    "accent_batch_stage_duration_seconds",
+    "Time spent in each pipeline stage per batch of texts processed together",
+    ("stage",),
+    STAGE_BUCKETS,
+)
+stage_errors = Counter("accent_stage_errors_total", "Errors raised by each pipeline stage", ("stage",))
+texts_total = Counter("accent_texts_total", "Texts processed")
+characters_total = Counter("accent_input_characters_total", "Characters of texts processed")
+morphemes_total = Counter("accent_morphemes_total", "Morphemes in texts processed")
+phrases_total = Counter("accent_phrases_total", "Accent phrases in texts processed")
+
+
+class stage:
+    """Time a pipeline stage, adding its duration to timings and counting its errors"""
+
+    __slots__ = ("name", "timings", "start")
+
+    def __init__(self, name: str, timings: dict | None):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = perf_counter() - self.start
+        if self.timings is not None:
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + elapsed
+        if exc_type is not None:
+            stage_errors.inc(labels=(self.name,))
+        return False
+
+
+def count_text(text: str, phrases) -> tuple[int, int]:
+    """Count one processed text with its phrases and morphemes, returning (phrases, morphemes)"""
+    nphrases = sum(1 for phrase in phrases if phrase)
+    nmorphemes = sum(len(phrase) for phrase in phrases)
+    texts_total.inc()
+    characters_total.inc(len(text))
+    phrases_total.inc(nphrases)
+    morphemes_total.inc(nmorphemes)
+    return nphrases, nmorphemes
+
+
+def record_text(text: str, phrases, timings: dict) -> None:
+    """Record the stage timings and sizes of one processed text, adding the sizes to timings"""
+    for name, seconds in timings.items():
+        stage_seconds.observe(seconds, (name,))
+    timings["phrases"], timings["morphemes"] = count_text(text, phrases)
+
+
+def record_batch(timings: dict) -> None:
+    """Record the stage timings of a batch of texts (each counted with count_text)"""
+    for name, seconds in timings.items():
+        batch_stage_seconds.observe(seconds, (name,))
+
+
+def server_timing(timings: dict) -> str:
+    """Format timings filled by process_text as a Server-Timing header value"""
+    entries = [f"{name};dur={timings[name] * 1000:.3f}" for name in STAGES if name in timings]
+    if "total" in timings:
+        entries.append(f"total;dur={timings['total'] * 1000:.3f}")
+    entries.extend(f'{name};desc="{timings[name]}"' for name in ("morphemes", "phrases", "cache") if name in timings)
+    return ", ".join(entries)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+from functools import lru_cache
+
+# Small kana that are not a mora by themselves
+NON_MORA = frozenset("ァィゥェォャュョ")
+
+# Distinct pronunciations are bounded by the dictionary
+MORA_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=MORA_CACHE_SIZE)
+def split_moras(pron: str) -> tuple[str, ...]:
+    """Split a pronunciation into moras, as mkdata_accent and rule count them
+
+    Every small kana joins the mora before it, so "キャァ" is one mora. A
+    pronunciation starting with a small kana raises IndexError. Results are
+    cached and their moras interned, so they are shared process-wide.
+    """
+    moras = []
+    for p in pron:
+        if p not in NON_MORA:
+            moras.append(p)
+        else:
+            moras[-1] += p
+    return tuple(sys.intern(mora) for mora in moras)
+
+
+@lru_cache(maxsize=MORA_CACHE_SIZE)
+def pair_moras(pron: str) -> tuple[str, ...]:
+    """Split a pronunciation into moras, as format_accent writes them
+
+    A kana forms a mora with at most one small kana after it, so a further
+    small kana pairs with the next one ("キャァ" is キャ, ァ) and a leading one
+    starts a mora. Without consecutive small kana this is split_moras.
+    """
+    moras = []
+    i = 0
+    while i < len(pron):
+        if i + 1 < len(pron) and pron[i + 1] in NON_MORA:
+            moras.append(pron[i:i + 2])
+            i += 2
+        else:
+            moras.append(pron[i])
+            i += 1
+    return tuple(sys.intern(mora) for mora in moras)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from operator import attrgetter
+
+# Columns of the seikei format (output of seikei_from_mecab)
+SEIKEI_FIELDS = (
+    "orth", "pron", "pos", "cType", "cForm", "lemma",
+    "goshu", "iType", "aType", "aConType", "aModType",
+    "irex", "bunsetsu",
+)
+
+# Columns added by mkdata_accent
+FEATURE_FIELDS = (
+    "nmora", "morph1", "morphl",
+    "nmorph", "issushi", "isjosushi",
+    "relAType", "josushiType", "two", "juuon",
+    "mora1", "mora2", "mora3", "mora4",
+    "mora5", "mora6", "mora7",
+    "aType1", "aConTypeFV", "aConTypeFA", "aConTypeFN",
+    "MaType1",
+)
+
+FIELDS = SEIKEI_FIELDS + FEATURE_FIELDS
+
+_get_fields = attrgetter(*FIELDS)
+_get_seikei_fields = attrgetter(*SEIKEI_FIELDS)
+
+
+class Morpheme:
+    """One morpheme passed between pipeline stages.
+
+    Attributes hold the values of the text columns as-is, so serializing a
+    record gives back exactly the row the *_text functions exchange.
+    `labels` holds the trailing label columns (rule accent, relative label,
+    CRF prediction, ...) that the later stages append or rewrite.
+    """
+
+    __slots__ = FIELDS + ("labels", "now_nmora", "prev_nmora")
+
+    def __init__(self, orth, pron, pos, cType, cForm, lemma,
+                 goshu, iType, aType, aConType, aModType, irex, bunsetsu):
+        self.orth = orth
+        self.pron = pron
+        self.pos = pos
+        self.cType = cType
+        self.cForm = cForm
+        self.lemma = lemma
+        self.goshu = goshu
+        self.iType = iType
+        self.aType = aType
+        self.aConType = aConType
+        self.aModType = aModType
+        self.irex = irex
+        self.bunsetsu = bunsetsu
+        self.labels = []
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Build a record from the columns of one row (13 seikei columns or more)"""
+        morpheme = cls(*columns[:13])
+        if len(columns) > 13:
+            for name, value in zip(FEATURE_FIELDS, columns[13:35]):
+                setattr(morpheme, name, value)
+            morpheme.labels = list(columns[35:])
+        return morpheme
+
+    def columns(self):
+        """Return all columns of the row, labels included"""
+        if not hasattr(self, "nmora"):
+            # Features are not added yet (seikei row)
+            return list(_get_seikei_fields(self)) + self.labels
+        return list(_get_fields(self)) + self.labels
+
+    def to_row(self):
+        """Serialize to one space-separated row"""
+        return " ".join(self.columns())
+
+
+def parse_phrases(text):
+    """Parse blank-line separated rows into phrases of records.
+
+    Every blank line closes the current phrase, even an empty one, so
+    serializing the phrases again keeps the blank lines of the input.
+    """
+    phrases = []
+    phrase = []
+    for line in text.splitlines():
+        if len(line.strip()) == 0:
+            phrases.append(phrase)
+            phrase = []
+            continue
+        phrase.append(Morpheme.from_columns(line.split()))
+    if phrase:
+        phrases.append(phrase)
+    return phrases
+
+
+def format_phrases(phrases):
+    """Serialize phrases of records, each followed by a blank line"""
+    output = []
+    for phrase in phrases:
+        for morpheme in phrase:
+            output.append(morpheme.to_row())
+        output.append("")
+    return "\n".join(output)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+
+from metrics import record_text, stage
+from text2accent import (
+    format_text,
+    label_phrases,
+    normalize_input,
+    process_text,
+    split_by_pyopenjtalk,
+    split_sentences,
+    warm_up,
+)
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _init_worker(mecab_dicdir: str, mecab_userdic: str | None) -> None:
+    warm_up(mecab_dicdir, mecab_userdic)
+
+
+def get_pool(jobs: int, mecab_dicdir: str, mecab_userdic: str | None) -> ProcessPoolExecutor:
+    """Return the shared pool of worker processes with preloaded engines"""
+    key = (jobs, mecab_dicdir, mecab_userdic)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                # Workers are spawned rather than forked from a process that may run threads
+                pool = ProcessPoolExecutor(
+                    max_workers=jobs,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(mecab_dicdir, mecab_userdic),
+                )
+                _pools[key] = pool
+    return pool
+
+
+def _worker_pid() -> int:
+    # Long enough for every idle worker to take one of the calls
+    time.sleep(0.01)
+    return os.getpid()
+
+
+def start_workers(pool: ProcessPoolExecutor, jobs: int) -> None:
+    """Wait until all jobs workers of pool have started and warmed up their engines"""
+    pids = set()
+    while len(pids) < jobs:
+        futures = [pool.submit(_worker_pid) for _ in range(jobs)]
+        pids.update(future.result() for future in futures)
+
+
+def discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died, so that get_pool starts a new one"""
+    with _pools_lock:
+        for key, value in list(_pools.items()):
+            if value is pool:
+                del _pools[key]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _label_run(text: str, mecab_dicdir: str, mecab_userdic: str | None, nmora: int | None):
+    """Label a run of accent phrases in a worker, returning the phrases and stage timings"""
+    timings = {}
+    return label_phrases(text, mecab_dicdir, mecab_userdic, nmora, timings), timings
+
+
+def log_fallback(error: Exception) -> None:
+    logger.warning(json.dumps({"event": "process_pool", "status": "fallback", "error": repr(error)}))
+
+
+def segment_for_workers(input_text: str) -> str:
+    """Segment text into accent phrases as process_text does
+
+    Texts too long for pyopenjtalk, which process_text fails on, are
+    segmented sentence by sentence instead.
+    """
+    try:
+        return split_by_pyopenjtalk(input_text)
+    except RuntimeError:
+        segmented = (split_by_pyopenjtalk(sentence) for sentence in split_sentences(input_text))
+        return "\n".join(phrases for phrases in segmented if phrases)
+
+
+def process_text_parallel(
+    input_text: str,
+    mecab_dicdir: str,
+    mecab_userdic: str | None,
+    jobs: int,
+    timings: dict | None = None,
+) -> str:
+    """Process text on a pool of worker processes, giving the same result as process_text.
+
+    The text is segmented into accent phrases here, and consecutive runs of
+    phrases are labelled by the workers and formatted together, so phrases
+    and their separators are the ones process_text makes. The phrases are
+    labelled here instead with one job or one phrase, and when a run fails
+    on its own or a worker dies (the broken pool is then replaced). The text
+    is recorded in the metrics of this process, with the stage timings of
+    the workers added up, and timings is filled like process_text fills it.
+
+    Only MeCab and the labelling stages run in the workers: segmentation by
+    pyopenjtalk and formatting stay serial here, which bounds the speed-up.
+    With the test dictionary, a 1,750 character document took 30-50 ms with
+    one job, of which segmentation was about two thirds and formatting a
+    twentieth, so no number of jobs can make it more than about 1.4 times
+    faster (1.3 times with four jobs). On a single CPU, jobs 2 and 4 were
+    slower (50-80 ms). A larger dictionary makes MeCab a larger share.
+    """
+    if jobs <= 1:
+        return process_text(input_text, mecab_dicdir, mecab_userdic, timings)
+    if timings is None:
+        timings = {}
+
+    with stage("segmentation", timings):
+        segmented = segment_for_workers(normalize_input(input_text))
+    lines = segmented.split("\n")
+    nchunks = min(len(lines), jobs * 4)
+    phrases = None
+    if nchunks > 1:
+        bounds = [len(lines) * i // nchunks for i in range(nchunks + 1)]
+        chunks = ["\n".join(lines[start:end]) for start, end in zip(bounds, bounds[1:])]
+
+        # Phrases of symbols only take the mora count of the last pronounced
+        # morpheme before them, but their labels are not used in the output, so
+        # later runs start from 0 instead of waiting for earlier ones.
+        carried = [None] + [0] * (nchunks - 1)
+        pool = get_pool(jobs, mecab_dicdir, mecab_userdic)
+        try:
+            results = list(pool.map(_label_run, chunks, repeat(mecab_dicdir), repeat(mecab_userdic), carried))
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                discard_pool(pool)
+            log_fallback(e)
+        else:
+            phrases = [phrase for run, _ in results for phrase in run]
+            for _, run_timings in results:
+                for name, seconds in run_timings.items():
+                    timings[name] = timings.get(name, 0.0) + seconds
+    if phrases is None:
+        phrases = label_phrases(segmented, mecab_dicdir, mecab_userdic, timings=timings)
+
+    result = format_text(phrases, timings)
+    record_text(input_text, phrases, timings)
+    return result
@@ -9,6 +9,42 @@ usage = u"""usage: %prog resultfile
 相対アクセントラベルをアクセント型に置き換える
 """
 
+def rel2abs_label(label, aType1, nmora):
+    """相対ラベル label をアクセント型に変換"""
+    if aType1 != 0:
+        if label == "non":
+            return 0
+        elif label == "same":
+            return aType1
+        elif label == "mora":
+            return nmora
+        elif label == "same-1":
+            return aType1-1
+        elif label == "atama":
+            return 1
+        elif label == "mora-1":
+            return nmora-1
+        else:
+            try:
+                return int(label) + aType1
+            except:
+                return aType1
+    else:
+        if label == "samenon":
+            return 0
+        elif label == "mora":
+            return nmora
+        elif label == "atama":
+            return 1
+        elif label == "mora-1":
+            return nmora-1
+        else:
+            try:
+                return int(label)
+            except:
+                return aType1
+
+
 def rel2abs_text(text):
     output = []
     # 入力ファイルのフォーマット
@@ -35,79 +71,27 @@ def rel2abs_text(text):
         if aType1 == "*": aType1 = 0
         aType1 = int(aType1)
 
-        # for ans
-        if aType1 != 0:
-            if ans == "non":
-                ans_abs = 0
-            elif ans == "same":
-                ans_abs = aType1
-            elif ans == "mora":
-                ans_abs = nmora
-            elif ans == "same-1":
-                ans_abs = aType1-1
-            elif ans == "atama":
-                ans_abs = 1
-            elif ans == "mora-1":
-                ans_abs = nmora-1
-            else:
-                try:
-                    ans_abs = int(ans) + aType1
-                except:
-                    ans_abs = aType1
-        else:
-            if ans == "samenon":
-                ans_abs = 0
-            elif ans == "mora":
-                ans_abs = nmora
-            elif ans == "atama":
-                ans_abs = 1
-            elif ans == "mora-1":
-                ans_abs = nmora-1
-            else:
-                try:
-                    ans_abs = int(ans)
-                except:
-                    ans_abs = aType1
-
-        # for hyp
-        if aType1 != 0:
-            if hyp == "non":
-                hyp_abs = 0
-            elif hyp == "same":
-                hyp_abs = aType1
-            elif hyp == "mora":
-                hyp_abs = nmora
-            elif hyp == "same-1":
-                hyp_abs = aType1-1
-            elif hyp == "atama":
-                hyp_abs = 1
-            elif hyp == "mora-1":
-                hyp_abs = nmora-1
-            else:
-                try:
-                    hyp_abs = int(hyp) + aType1
-                except:
-                    hyp_abs = aType1
-        else:
-            if hyp == "samenon":
-                hyp_abs = 0
-            elif hyp == "mora":
-                hyp_abs = nmora
-            elif hyp == "atama":
-                hyp_abs = 1
-            elif hyp == "mora-1":
-                hyp_abs = nmora-1
-            else:
-                try:
-                    hyp_abs = int(hyp)
-                except:
-                    hyp_abs = aType1
+        ans_abs = rel2abs_label(ans, aType1, nmora)
+        hyp_abs = rel2abs_label(hyp, aType1, nmora)
 
         output.append(" ".join(features[:-2] + [str(ans_abs), str(hyp_abs)]))
 
     return "\n".join(output)
 
 
+def rel2abs_records(phrases):
+    """アクセント句（Morpheme のリスト）ごとに、最後の二つのラベル（正解・推定）をアクセント型に置き換える"""
+    for phrase in phrases:
+        for m in phrase:
+            nmora = int(m.nmora)
+            aType1 = m.aType1
+            if aType1 == "*": aType1 = 0
+            aType1 = int(aType1)
+            m.labels[-2] = str(rel2abs_label(m.labels[-2], aType1, nmora))
+            m.labels[-1] = str(rel2abs_label(m.labels[-1], aType1, nmora))
+    return phrases
+
+
 def main(argv=None):
     parser = OptionParser(usage=usage)
     (options,args) = parser.parse_args(argv)
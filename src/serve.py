@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import gc
+import glob
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+
+import uvicorn
+
+import metrics
+import server
+from text2accent import warm_up
+
+
+def default_workers() -> int:
+    """Number of CPUs available to this process"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run the accent API on prefork workers sharing engines loaded once"
+    )
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=2954, help="Port to listen on")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("ACCENT_SERVER_WORKERS", "0")) or default_workers(),
+        help="Number of worker processes (default: available CPUs)",
+    )
+    parser.add_argument("--backlog", type=int, default=2048, help="Listen backlog")
+    parser.add_argument(
+        "--metrics-dir",
+        default=os.environ.get("ACCENT_METRICS_DIR"),
+        help="Directory the workers share metrics through (default: a new temporary directory)",
+    )
+    return parser.parse_args()
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def prepare_metrics_dir(path: str | None) -> tuple[str, bool]:
+    """Return an empty metrics directory, and whether it is a temporary one to remove"""
+    if path is None:
+        return tempfile.mkdtemp(prefix="accent-metrics-"), True
+    os.makedirs(path, exist_ok=True)
+    for snapshot in glob.glob(os.path.join(path, "*.json")):
+        os.remove(snapshot)
+    return path, False
+
+
+def run_worker(sock: socket.socket, metrics_dir: str) -> None:
+    """Serve the app on the inherited socket until uvicorn exits"""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # /metrics of any worker reports the values of all of them
+    metrics.enable_multiprocess(metrics_dir)
+    config = uvicorn.Config(server.app, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn_worker(sock: socket.socket, metrics_dir: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(sock, metrics_dir)
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+        os._exit(0)
+    return pid
+
+
+def main():
+    args = parse_args()
+
+    # Load pyopenjtalk, MeCab, the CRF model and the feature index once, so
+    # the workers share them copy-on-write
+    warm_up(server.MECAB_DICDIR, server.MECAB_USERDIC)
+    sock = bind_socket(args.host, args.port, args.backlog)
+    metrics_dir, temporary = prepare_metrics_dir(args.metrics_dir)
+    # Keep the garbage collector from touching (and copying) preloaded objects
+    gc.collect()
+    gc.freeze()
+
+    stopping = False
+    workers = set()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(args.workers):
+        workers.add(spawn_worker(sock, metrics_dir))
+    print(f"serving on {args.host}:{args.port} with {args.workers} workers", file=sys.stderr)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            print(f"worker {pid} exited with status {status}, restarting", file=sys.stderr)
+            time.sleep(1)
+            if not stopping:
+                workers.add(spawn_worker(sock, metrics_dir))
+
+    sock.close()
+    if temporary:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
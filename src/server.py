@@ -1,16 +1,34 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
 import json
 import logging
 import os
+import threading
 import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 
-from text2accent import process_text
+from cache import ResultCache
+from executor import BoundedExecutor, QueueFull
+from metrics import Counter, FunctionCounter, Gauge, Histogram, render, server_timing, write_snapshot
+from parallel import process_text_parallel
+from text2accent import (
+    WARM_UP_TEXTS,
+    normalize_input,
+    phrase_memo,
+    process_sentence,
+    process_text,
+    process_texts,
+    split_sentences,
+    warm_up,
+)
 
 # Configure JSON logging
 logging.basicConfig(
@@ -19,15 +37,89 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Configuration from environment variables
+MECAB_DICDIR = os.environ.get("MECAB_DICDIR", "/usr/src/app/unidic")
+MECAB_USERDIC = os.environ.get("MECAB_USERDIC", "/usr/src/app/user.dic")
+CACHE_MAX_ENTRIES = int(os.environ.get("ACCENT_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.environ.get("ACCENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_TTL = float(os.environ.get("ACCENT_CACHE_TTL", "0"))
+JOBS = int(os.environ.get("ACCENT_JOBS", "1"))
+PARALLEL_MIN_CHARS = int(os.environ.get("ACCENT_PARALLEL_MIN_CHARS", "200"))
+BATCH_MAX_TEXTS = int(os.environ.get("ACCENT_BATCH_MAX_TEXTS", "1000"))
+WORKERS = int(os.environ.get("ACCENT_WORKERS", "4"))
+QUEUE_SIZE = int(os.environ.get("ACCENT_QUEUE_SIZE", "64"))
+RETRY_AFTER = int(os.environ.get("ACCENT_RETRY_AFTER", "1"))
+SERVER_TIMING = os.environ.get("ACCENT_SERVER_TIMING", "0") == "1"
+
+result_cache = ResultCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL)
+# Blocking pipeline work runs here, off the event loop
+executor = BoundedExecutor(WORKERS, QUEUE_SIZE)
+
+
+http_requests = Counter("accent_http_requests_total", "HTTP requests", ("method", "path", "status"))
+http_seconds = Histogram("accent_http_request_duration_seconds", "HTTP request latency", ("method", "path"))
+Gauge("accent_executor_in_flight", "Tasks running on the executor", lambda: executor.stats()["in_flight"])
+Gauge("accent_executor_queued", "Tasks waiting for an executor thread", lambda: executor.stats()["queued"])
+FunctionCounter("accent_executor_rejected_total", "Tasks rejected because the queue was full", lambda: executor.rejected)
+Gauge("accent_result_cache_entries", "Cached results", lambda: result_cache.stats()["entries"])
+FunctionCounter("accent_result_cache_hits_total", "Result cache hits", lambda: result_cache.hits)
+Gauge("accent_phrase_memo_entries", "Memoized accent phrases", lambda: phrase_memo.stats()["entries"])
+
+# Set once warm_up has loaded every engine
+ready = threading.Event()
+warm_up_error = None
+
+
+def run_warm_up() -> None:
+    """Load the engines and fill the caches before reporting ready"""
+    global warm_up_error
+    start_time = time.time()
+    try:
+        warm_up(MECAB_DICDIR, MECAB_USERDIC)
+        if JOBS > 1:
+            # Start the worker processes too
+            process_text_parallel("".join(WARM_UP_TEXTS), MECAB_DICDIR, MECAB_USERDIC, JOBS)
+    except Exception as e:
+        warm_up_error = str(e)
+        logger.error(json.dumps({"event": "warm_up", "status": "failed", "error": warm_up_error}))
+        return
+    ready.set()
+    logger.info(json.dumps({"event": "warm_up", "status": "ready", "elapsed": round(time.time() - start_time, 3)}))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so liveness checks are answered meanwhile
+    threading.Thread(target=run_warm_up, name="warm-up", daemon=True).start()
+    yield
+    executor.shutdown()
+    write_snapshot()
+
+
 app = FastAPI(
     title="Japanese Accent API",
     description="Convert Japanese text to accent-annotated format for VOICEVOX",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
-# Configuration from environment variables
-MECAB_DICDIR = os.environ.get("MECAB_DICDIR", "/usr/src/app/unidic")
-MECAB_USERDIC = os.environ.get("MECAB_USERDIC", "/usr/src/app/user.dic")
+
+BUSY_DETAIL = "Server is busy, retry later"
+
+
+def server_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=BUSY_DETAIL,
+        headers={"Retry-After": str(RETRY_AFTER)},
+    )
+
+
+def analyze_text(text: str, timings: dict | None = None) -> str:
+    """Process one text, split across worker processes if it is long"""
+    if JOBS > 1 and len(text) >= PARALLEL_MIN_CHARS:
+        return process_text_parallel(text, MECAB_DICDIR, MECAB_USERDIC, JOBS, timings)
+    return process_text(text, MECAB_DICDIR, MECAB_USERDIC, timings)
 
 
 @app.middleware("http")
@@ -46,6 +138,12 @@ async def log_requests(request: Request, call_next):
     # Calculate elapsed time
     elapsed = time.time() - start_time
 
+    # Label metrics by route rather than raw path to bound their number
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    http_requests.inc(labels=(request.method, path, str(response.status_code)))
+    http_seconds.observe(elapsed, (request.method, path))
+
     # Get request body size from Content-Length header
     body_recv = int(request.headers.get("content-length", 0))
 
@@ -98,30 +196,227 @@ class AccentResponse(BaseModel):
     }
 
 
+class AccentBatchRequest(BaseModel):
+    texts: list[str]
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {"texts": ["こんにちは、世界。", ""]}
+            ]
+        }
+    }
+
+
+class AccentBatchItem(BaseModel):
+    accent: str | None = None
+    error: str | None = None
+
+
+class AccentBatchResponse(BaseModel):
+    results: list[AccentBatchItem]
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {"results": [{"accent": "コンニチワ'/セ'カイ"}, {"error": "Text cannot be empty"}]}
+            ]
+        }
+    }
+
+
 @app.get("/")
 async def root():
-    """Health check endpoint"""
+    """Liveness check endpoint"""
     return {"status": "ok", "message": "Japanese Accent API is running"}
 
 
+@app.get("/ready")
+async def readiness():
+    """Readiness check endpoint (200 once the engines are warmed up)"""
+    if ready.is_set():
+        return {"status": "ready"}
+    if warm_up_error is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "detail": warm_up_error})
+    return JSONResponse(status_code=503, content={"status": "warming_up"})
+
+
 @app.post("/accent", response_model=AccentResponse)
-async def convert_accent(request: AccentRequest) -> AccentResponse:
+async def convert_accent(
+    request: AccentRequest,
+    response: Response,
+    x_server_timing: str | None = Header(default=None),
+) -> AccentResponse:
     """Convert Japanese text to accent-annotated format.
 
+    With ACCENT_SERVER_TIMING=1 or an "X-Server-Timing: 1" request header, the
+    response has a Server-Timing header with the duration of each stage.
+
     Args:
         request: Request containing Japanese text
+        response: Response to add headers to
+        x_server_timing: X-Server-Timing header
 
     Returns:
         Response containing accent-annotated text
 
     Raises:
-        HTTPException: If text processing fails
+        HTTPException: If text processing fails or the server is busy
     """
     if not request.text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
 
-    try:
-        result = process_text(request.text, MECAB_DICDIR, MECAB_USERDIC)
+    timings = {} if SERVER_TIMING or x_server_timing == "1" else None
+    start_time = time.perf_counter()
+
+    key = normalize_input(request.text)
+    result = result_cache.get(key)
+    if result is not None:
+        if timings is not None:
+            timings["cache"] = "hit"
+            timings["total"] = time.perf_counter() - start_time
+            response.headers["Server-Timing"] = server_timing(timings)
         return AccentResponse(accent=result)
+
+    try:
+        result = await executor.run(analyze_text, request.text, timings)
+    except QueueFull:
+        raise server_busy()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+    result_cache.put(key, result)
+    if timings is not None:
+        timings["total"] = time.perf_counter() - start_time
+        response.headers["Server-Timing"] = server_timing(timings)
+    return AccentResponse(accent=result)
+
+
+@app.post("/accent/batch", response_model=AccentBatchResponse, response_model_exclude_none=True)
+async def convert_accent_batch(request: AccentBatchRequest) -> AccentBatchResponse:
+    """Convert many Japanese texts to accent-annotated format in one pass.
+
+    Duplicate texts are processed once, and texts not cached go through MeCab
+    and the CRF together.
+
+    Args:
+        request: Request containing Japanese texts
+
+    Returns:
+        Response containing a result or an error for each text, in order
+
+    Raises:
+        HTTPException: If there are too many texts or the server is busy
+    """
+    if len(request.texts) > BATCH_MAX_TEXTS:
+        raise HTTPException(status_code=400, detail=f"Too many texts (max {BATCH_MAX_TEXTS})")
+
+    keys = [normalize_input(text) for text in request.texts]
+    items = {}
+    for key in dict.fromkeys(keys):
+        if not key.strip():
+            items[key] = AccentBatchItem(error="Text cannot be empty")
+            continue
+        result = result_cache.get(key)
+        if result is not None:
+            items[key] = AccentBatchItem(accent=result)
+
+    pending = [key for key in dict.fromkeys(keys) if key not in items]
+    if pending:
+        try:
+            results = await executor.run(process_texts, pending, MECAB_DICDIR, MECAB_USERDIC, True)
+        except QueueFull:
+            raise server_busy()
+        except Exception as e:
+            results = [e] * len(pending)
+        for key, result in zip(pending, results):
+            if isinstance(result, Exception):
+                items[key] = AccentBatchItem(error=f"Processing failed: {str(result)}")
+            else:
+                result_cache.put(key, result)
+                items[key] = AccentBatchItem(accent=result)
+
+    return AccentBatchResponse(results=[items[key] for key in keys])
+
+
+@app.post("/accent/stream")
+async def stream_accent(
+    request: AccentRequest,
+    accept: str | None = Header(default=None),
+) -> StreamingResponse:
+    """Convert Japanese text to accent-annotated format sentence by sentence.
+
+    Each sentence is sent as soon as it is processed, as a JSON object with its
+    index, text and accent (or error). Objects are sent as NDJSON, or as
+    server-sent events if the client accepts text/event-stream.
+
+    Args:
+        request: Request containing Japanese text
+        accept: Accept header
+
+    Returns:
+        Streaming response of sentence results
+
+    Raises:
+        HTTPException: If the text is empty or the server is busy
+    """
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+
+    sse = accept is not None and "text/event-stream" in accept
+
+    # Each sentence is a task of its own on the executor, submitted once the
+    # previous one is sent, so a long stream takes turns with other requests
+    # instead of holding a thread. The first is submitted now to answer 503
+    # when busy. When the client goes away, Starlette cancels this generator
+    # and the wait for the current sentence, which cancels its task unless it
+    # already runs, so no later sentence is processed.
+    sentences = split_sentences(request.text)
+    try:
+        first = executor.submit(process_sentence, sentences[0], MECAB_DICDIR, MECAB_USERDIC, None)
+    except QueueFull:
+        raise server_busy()
+
+    async def events():
+        nmora = None
+        for index, sentence in enumerate(sentences):
+            item = {"index": index, "text": sentence}
+            try:
+                if index == 0:
+                    result, nmora = await asyncio.wrap_future(first)
+                else:
+                    result, nmora = await executor.run(process_sentence, sentence, MECAB_DICDIR, MECAB_USERDIC, nmora)
+            except QueueFull:
+                item["error"] = BUSY_DETAIL
+            else:
+                if isinstance(result, Exception):
+                    item["error"] = f"Processing failed: {str(result)}"
+                else:
+                    item["accent"] = result
+            data = json.dumps(item, ensure_ascii=False)
+            yield f"data: {data}\n\n" if sse else data + "\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache"},
+        # Frees the first task if the client went away before the stream started
+        background=BackgroundTask(first.cancel),
+    )
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Result cache and phrase memo statistics"""
+    return {"results": result_cache.stats(), "phrases": phrase_memo.stats()}
+
+
+@app.get("/executor/stats")
+async def executor_stats():
+    """Worker pool queue depth and in-flight task statistics"""
+    return executor.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Metrics in Prometheus text format"""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# Modules are imported by name, as the scripts next to them do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def dictionaries():
+    """MeCab dictionary directory and user dictionary, skipping tests that need them when missing
+
+    The CRF model (model_accent) is looked up in the working directory, as
+    the pipeline does, so run the tests from the directory holding it.
+    """
+    mecab_dicdir = os.environ.get("MECAB_DICDIR", "/usr/src/app/unidic")
+    mecab_userdic = os.environ.get("MECAB_USERDIC", "/usr/src/app/user.dic") or None
+    if not os.path.isdir(mecab_dicdir):
+        pytest.skip(f"no MeCab dictionary at {mecab_dicdir} (set MECAB_DICDIR)")
+    if mecab_userdic is not None and not os.path.isfile(mecab_userdic):
+        pytest.skip(f"no user dictionary at {mecab_userdic} (set MECAB_USERDIC, empty to disable)")
+    if not os.path.isfile("model_accent"):
+        pytest.skip("no CRF model model_accent in the working directory")
+    return mecab_dicdir, mecab_userdic
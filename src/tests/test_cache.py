@@ -0,0 +1,50 @@
+import time
+
+from cache import ResultCache
+
+
+def test_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 3, 1, 1)
+
+
+def test_evicts_by_size():
+    cache = ResultCache(max_entries=100, max_bytes=10)
+    cache.put("あ", "1234")  # 3 + 4 bytes
+    cache.put("b", "123")
+    assert cache.get("あ") is None
+    assert cache.get("b") == "123"
+
+    # An entry larger than the cache is not stored
+    cache.put("c", "x" * 20)
+    assert cache.get("c") is None
+    assert cache.stats()["bytes"] == 4
+
+    # Replacing an entry accounts for its new size
+    cache.put("b", "1234")
+    assert cache.stats()["bytes"] == 5
+
+
+def test_expires_after_ttl():
+    cache = ResultCache(max_entries=10, ttl=0.05)
+    cache.put("a", "1")
+    assert cache.get("a") == "1"
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["expirations"]) == (0, 0, 1)
+
+
+def test_disabled_cache_stores_nothing():
+    for cache in (ResultCache(max_entries=0), ResultCache(max_entries=10, max_bytes=0)):
+        cache.put("a", "1")
+        assert cache.get("a") is None
+        assert cache.stats()["entries"] == 0
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+import pytest
+
+from executor import BoundedExecutor, QueueFull
+
+
+def wait_idle(executor: BoundedExecutor) -> dict:
+    """Return the stats once no task is pending (slots are freed just after a task returns)"""
+    for _ in range(100):
+        stats = executor.stats()
+        if stats["in_flight"] == 0 and stats["queued"] == 0:
+            return stats
+        threading.Event().wait(0.01)
+    return executor.stats()
+
+
+def test_rejects_beyond_workers_and_queue():
+    executor = BoundedExecutor(max_workers=2, max_queue=1)
+    release = threading.Event()
+    futures = [executor.submit(release.wait) for _ in range(3)]
+    with pytest.raises(QueueFull):
+        executor.submit(release.wait)
+    stats = executor.stats()
+    assert stats["rejected"] == 1
+    assert stats["in_flight"] + stats["queued"] == 3
+
+    release.set()
+    for future in futures:
+        future.result()
+    assert executor.submit(sum, [1, 2]).result() == 3
+    stats = wait_idle(executor)
+    assert (stats["completed"], stats["queued"], stats["in_flight"]) == (4, 0, 0)
+    executor.shutdown()
+
+
+def test_run_returns_result_and_raises():
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+    assert asyncio.run(executor.run(sum, [1, 2, 3])) == 6
+    with pytest.raises(ValueError):
+        asyncio.run(executor.run(int, "x"))
+    assert wait_idle(executor)["completed"] == 2
+    executor.shutdown()
+
+
+def test_cancelled_queued_tasks_free_their_slots():
+    executor = BoundedExecutor(max_workers=1, max_queue=2)
+    release = threading.Event()
+    ran = []
+
+    async def main():
+        running = asyncio.ensure_future(executor.run(release.wait))
+        queued = [asyncio.ensure_future(executor.run(ran.append, i)) for i in range(2)]
+        await asyncio.sleep(0.05)
+        assert executor.stats()["queued"] == 2
+        with pytest.raises(QueueFull):
+            executor.submit(release.wait)
+
+        # Callers going away (a client disconnect, a timeout) cancel the queued tasks
+        for task in queued:
+            task.cancel()
+        await asyncio.gather(*queued, return_exceptions=True)
+        release.set()
+        await running
+
+    asyncio.run(main())
+    stats = wait_idle(executor)
+    assert (stats["queued"], stats["in_flight"], stats["completed"]) == (0, 0, 1)
+    assert ran == []
+    # Every slot is free again
+    futures = [executor.submit(release.wait) for _ in range(3)]
+    for future in futures:
+        future.result()
+    executor.shutdown()
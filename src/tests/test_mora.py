@@ -0,0 +1,28 @@
+import random
+
+import pytest
+
+from bench import legacy_pair_moras, legacy_split_moras
+from mora import NON_MORA, pair_moras, split_moras
+
+KANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワヲンガギグゲゴザジズゼゾダヂヅデドバビブベボパピプペポヴー"
+PRONUNCIATIONS = ["ア", "キョウ", "シュッパツ", "ファイル", "ヴェニス", "チェーン"]
+
+
+def random_pronunciations(samples: int) -> list[str]:
+    """Pronunciations starting with a mora, as the TASET split requires"""
+    rng = random.Random(0)
+    chars = KANA + "".join(sorted(NON_MORA))
+    return [rng.choice(KANA) + "".join(rng.choices(chars, k=rng.randint(0, 12))) for _ in range(samples)]
+
+
+@pytest.mark.parametrize("pron", PRONUNCIATIONS)
+def test_moras_of_known_words(pron):
+    assert split_moras(pron) == tuple(legacy_split_moras(pron))
+    assert pair_moras(pron) == tuple(legacy_pair_moras(pron))
+
+
+def test_moras_match_legacy():
+    for pron in random_pronunciations(5000):
+        assert split_moras(pron) == tuple(legacy_split_moras(pron)), pron
+        assert pair_moras(pron) == tuple(legacy_pair_moras(pron)), pron
@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from text2accent import normalize_accent
+
+# Characters normalize_accent sees: kana, small kana, marks and boundaries
+ACCENT_CHARS = "アカキクケコサシスセソタチツテトナハフマヤユヨラリルレロワヲンガジズデドバパヴァィゥェォャュョッー'/、,，?？。！…〜～・"
+
+LEGACY_VOWELS = {
+    'ア': 'ア', 'カ': 'ア', 'サ': 'ア', 'タ': 'ア', 'ナ': 'ア',
+    'ハ': 'ア', 'マ': 'ア', 'ヤ': 'ア', 'ラ': 'ア', 'ワ': 'ア',
+    'ガ': 'ア', 'ザ': 'ア', 'ダ': 'ア', 'バ': 'ア', 'パ': 'ア',
+    'ファ': 'ア', 'ヴァ': 'ア',
+    'イ': 'イ', 'キ': 'イ', 'シ': 'イ', 'チ': 'イ', 'ニ': 'イ',
+    'ヒ': 'イ', 'ミ': 'イ', 'リ': 'イ', 'ギ': 'イ', 'ジ': 'イ',
+    'ビ': 'イ', 'ピ': 'イ', 'ディ': 'イ', 'ティ': 'イ', 'フィ': 'イ', 'ヴィ': 'イ',
+    'ウ': 'ウ', 'ク': 'ウ', 'ス': 'ウ', 'ツ': 'ウ', 'ヌ': 'ウ',
+    'フ': 'ウ', 'ム': 'ウ', 'ユ': 'ウ', 'ル': 'ウ', 'グ': 'ウ',
+    'ズ': 'ウ', 'ブ': 'ウ', 'プ': 'ウ', 'ドゥ': 'ウ', 'トゥ': 'ウ', 'ヴ': 'ウ',
+    'ッ': 'ウ',
+    'エ': 'エ', 'ケ': 'エ', 'セ': 'エ', 'テ': 'エ', 'ネ': 'エ',
+    'ヘ': 'エ', 'メ': 'エ', 'レ': 'エ', 'ゲ': 'エ', 'ゼ': 'エ',
+    'デ': 'エ', 'ベ': 'エ', 'ペ': 'エ', 'フェ': 'エ', 'ヴェ': 'エ',
+    'オ': 'オ', 'コ': 'オ', 'ソ': 'オ', 'ト': 'オ', 'ノ': 'オ',
+    'ホ': 'オ', 'モ': 'オ', 'ヨ': 'オ', 'ロ': 'オ', 'ヲ': 'オ',
+    'ゴ': 'オ', 'ゾ': 'オ', 'ド': 'オ', 'ボ': 'オ', 'ポ': 'オ',
+    'フォ': 'オ', 'ヴォ': 'オ',
+    'ン': 'ン',
+    'ャ': 'ア', 'ュ': 'ウ', 'ョ': 'オ',
+    'ァ': 'ア', 'ィ': 'イ', 'ゥ': 'ウ', 'ェ': 'エ', 'ォ': 'オ',
+}
+
+
+def legacy_normalize_accent(text: str) -> str:
+    """convert_long_vowel_mark and normalize_punctuation, which normalize_accent replaced"""
+    result = []
+    for char in text:
+        if char in "。！…〜～・":
+            continue
+        if char == 'ー' and result:
+            last_kana = None
+            for j in range(len(result) - 1, -1, -1):
+                if result[j] not in ("'", "/"):
+                    if j > 0:
+                        two_char = ''.join(result[j-1:j+1])
+                        if two_char in LEGACY_VOWELS:
+                            last_kana = two_char
+                            break
+                    last_kana = result[j]
+                    break
+            result.append(LEGACY_VOWELS.get(last_kana, 'ウ'))
+        else:
+            result.append(char)
+
+    text = "".join({",": "、", "，": "、", "?": "？"}.get(char, char) for char in result)
+    while "//" in text:
+        text = text.replace("//", "/")
+    text = text.replace("/、", "、")
+    text = text.replace("、/", "、")
+    while "、、" in text:
+        text = text.replace("、、", "、")
+    text = text.replace("/？", "？")
+    text = text.replace("'？", "？")
+    return text.strip("/").strip("、")
+
+
+def random_texts(samples: int) -> list[str]:
+    rng = random.Random(0)
+    return ["".join(rng.choices(ACCENT_CHARS, k=rng.randint(1, 30))) for _ in range(samples)]
+
+
+@pytest.mark.parametrize("text", ["", "ー", "'ー", "/ー", "ア'ー/、", "キョ'ーワ/、、/イ'ー？", "ファー/ディー/ドゥー", "、/ア/、"])
+def test_normalize_accent_edge_cases(text):
+    assert normalize_accent(text) == legacy_normalize_accent(text)
+
+
+def test_normalize_accent_matches_legacy():
+    for text in random_texts(5000):
+        assert normalize_accent(text) == legacy_normalize_accent(text), text
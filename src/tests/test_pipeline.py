@@ -0,0 +1,181 @@
+import logging
+import os
+import shutil
+
+import pytest
+
+import bulk
+import feature_index
+from abs2rel import abs2rel_text
+from eval import TEST_CASES
+from format_accent import format_accent_text
+from mkdata_accent import mkdata_accent_text
+from parallel import discard_pool, get_pool, process_text_parallel
+from rel2abs import rel2abs_text
+from rule import rule_text
+from text2accent import (
+    normalize_accent,
+    normalize_input,
+    phrase_memo,
+    process_text,
+    process_texts,
+    run_crf_test_command,
+    seikei_from_mecab,
+    split_by_pyopenjtalk,
+)
+
+TEXTS = [text for text, _ in TEST_CASES] + [
+    "こんにちは、世界。",
+    "今日は良い天気ですね？",
+    "ファイルをダウンロードしています…",
+    "",
+]
+
+
+@pytest.fixture(scope="module")
+def crf_test():
+    if shutil.which("crf_test") is None:
+        pytest.skip("no crf_test command on PATH")
+
+
+@pytest.fixture(autouse=True)
+def cold_memo():
+    """Start every test with an empty phrase memo"""
+    phrase_memo.clear()
+    yield
+    phrase_memo.clear()
+
+
+def outcome(function, *args):
+    """Result of a call, or the type of the exception it raised"""
+    try:
+        return function(*args)
+    except Exception as e:
+        return type(e)
+
+
+def reference_stages(text: str, mecab_dicdir: str, mecab_userdic: str | None) -> dict:
+    """Run the text stages of the TASET tools one after another, with crf_test, as the pipeline did before"""
+    stages = {}
+    stages["segmented"] = split_by_pyopenjtalk(normalize_input(text))
+    stages["mecab"] = seikei_from_mecab(stages["segmented"], mecab_dicdir, mecab_userdic)
+    stages["mkdata_accent"] = mkdata_accent_text(stages["mecab"])
+    stages["rule"] = rule_text(stages["mkdata_accent"])
+    stages["abs2rel"] = abs2rel_text(stages["rule"])
+    stages["crf"] = run_crf_test_command(stages["abs2rel"], "model_accent")
+    stages["rel2abs"] = rel2abs_text(stages["crf"])
+    stages["format_accent"] = format_accent_text(stages["rel2abs"])
+    stages["normalize"] = normalize_accent(stages["format_accent"])
+    return stages
+
+
+def reference_process_text(text: str, mecab_dicdir: str, mecab_userdic: str | None) -> str:
+    return reference_stages(text, mecab_dicdir, mecab_userdic)["normalize"]
+
+
+def test_process_text_matches_reference(dictionaries, crf_test):
+    for text in TEXTS:
+        expected = outcome(reference_process_text, text, *dictionaries)
+        assert outcome(process_text, text, *dictionaries) == expected, text
+        # Again from the phrase memo
+        assert outcome(process_text, text, *dictionaries) == expected, text
+
+
+def test_process_texts_matches_process_text(dictionaries):
+    expected = [outcome(process_text, text, *dictionaries) for text in TEXTS]
+    phrase_memo.clear()
+    results = process_texts(TEXTS, *dictionaries, return_exceptions=True)
+    assert [type(result) if isinstance(result, Exception) else result for result in results] == expected
+
+
+def test_numpy_decoder_matches_crf_test(dictionaries, crf_test):
+    if not os.path.isfile("model_accent.txt"):
+        pytest.skip("no text model model_accent.txt in the working directory")
+    from crf_numpy import get_model
+
+    model = get_model("model_accent.txt")
+    inputs = []
+    for text in TEXTS:
+        try:
+            inputs.append(reference_stages(text, *dictionaries)["abs2rel"])
+        except Exception:
+            continue
+    assert inputs
+    for crf_input in inputs + ["".join(inputs)]:
+        assert model.parse(crf_input) == run_crf_test_command(crf_input, "model_accent")
+
+
+def test_process_text_parallel_matches_process_text(dictionaries, caplog):
+    # Sentences of a long document, leaving out those the dictionary fails on
+    sentences = [text for text in TEXTS if text and not isinstance(outcome(process_text, text, *dictionaries), type)]
+    text = "".join(sentences) * 3
+    expected = process_text(text, *dictionaries)
+    try:
+        with caplog.at_level(logging.INFO, logger="parallel"):
+            for jobs in (2, 4):
+                phrase_memo.clear()
+                assert process_text_parallel(text, *dictionaries, jobs) == expected
+        # The phrases were labelled by the workers, not by the fallback here
+        assert not [record for record in caplog.records if "fallback" in record.getMessage()]
+    finally:
+        for jobs in (2, 4):
+            discard_pool(get_pool(jobs, *dictionaries))
+
+
+def test_feature_index_gives_same_results(dictionaries, tmp_path):
+    mecab_dicdir, mecab_userdic = dictionaries
+    paths = [mecab_dicdir] + ([mecab_userdic] if mecab_userdic else [])
+    path = str(tmp_path / "feature_index.bin")
+    features = feature_index.build_feature_index(paths)
+    feature_index.write_feature_index(
+        path, features, feature_index.dictionary_hash(paths), feature_index.dictionary_stat_key(paths)
+    )
+
+    saved = feature_index._index
+    try:
+        feature_index._index = {}
+        expected = [outcome(process_text, text, *dictionaries) for text in TEXTS]
+        feature_index._index = feature_index.FeatureIndex(path)
+        feature_index.check_feature_index(*dictionaries)
+        assert isinstance(feature_index._index, feature_index.FeatureIndex)
+        phrase_memo.clear()
+        assert [outcome(process_text, text, *dictionaries) for text in TEXTS] == expected
+    finally:
+        feature_index._index = saved
+
+
+def test_bulk_resume_matches_uninterrupted_run(dictionaries, tmp_path):
+    mecab_dicdir, mecab_userdic = dictionaries
+
+    class Interrupted(Exception):
+        pass
+
+    def interrupted(records, count):
+        for index, record in enumerate(records):
+            if index == count:
+                raise Interrupted
+            yield record
+
+    options = ["--mecab-dicdir", mecab_dicdir, "--mecab-userdic", mecab_userdic or "", "--chunk-size", "3", "-j", "1"]
+    input_path = str(tmp_path / "input.txt")
+    with open(input_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(text for text, _ in TEST_CASES[:10]) + "\n")
+    expected_path = str(tmp_path / "expected.jsonl")
+    bulk.main([input_path, "-o", expected_path] + options)
+
+    # Stop in the third chunk, leaving a partial line after the checkpoint
+    output_path = str(tmp_path / "output.jsonl")
+    with open(output_path, "wb") as out:
+        with pytest.raises(Interrupted):
+            bulk.write_jsonl(
+                interrupted(bulk.read_records([input_path], "text"), 7),
+                out, mecab_dicdir, mecab_userdic, 1, 3, output_path + ".progress",
+            )
+        out.write(b'{"line": 7, "te')
+    assert bulk.load_progress(output_path + ".progress")["lines"] == 6
+    bulk.main([input_path, "-o", output_path, "--resume"] + options)
+
+    with open(expected_path, "rb") as f:
+        expected = f.read()
+    with open(output_path, "rb") as f:
+        assert f.read() == expected
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+import server  # noqa: E402
+from executor import BoundedExecutor  # noqa: E402
+from text2accent import process_sentences, process_text  # noqa: E402
+
+TEXTS = ["こんにちは、世界。", "今日は良い天気ですね？", "推論モデルがループしがちって、実は学習のクセや確率分布の偏りが大きいみたい。"]
+STREAM_TEXT = "正しい進み方が難しいと、楽な繰り返しに逃げちゃうんだって。あと、モデル自体が同じ行動を選びやすい性質もあるらしいよ。"
+
+
+@pytest.fixture(scope="module")
+def client(dictionaries):
+    if (server.MECAB_DICDIR, server.MECAB_USERDIC or None) != dictionaries:
+        pytest.skip("server was configured with other dictionaries")
+    with TestClient(server.app) as client:
+        deadline = time.monotonic() + 120
+        while client.get("/ready").status_code != 200:
+            if server.warm_up_error is not None or time.monotonic() > deadline:
+                pytest.fail(f"server not ready: {client.get('/ready').json()}")
+            time.sleep(0.1)
+        yield client
+
+
+@pytest.fixture
+def busy_executor(monkeypatch):
+    """Replace the server executor with one whose only slot is taken"""
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+    release = threading.Event()
+    executor.submit(release.wait)
+    monkeypatch.setattr(server, "executor", executor)
+    yield executor
+    release.set()
+    executor.shutdown()
+
+
+def test_ready(client, monkeypatch):
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+    monkeypatch.setattr(server, "ready", threading.Event())
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "warming_up"}
+
+    monkeypatch.setattr(server, "warm_up_error", "no dictionary")
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "failed", "detail": "no dictionary"}
+
+
+def test_accent(client, dictionaries):
+    for text in TEXTS:
+        expected = process_text(text, *dictionaries)
+        response = client.post("/accent", json={"text": text})
+        assert response.status_code == 200
+        assert response.json() == {"accent": expected}
+
+    # Answered from the result cache
+    hits = server.result_cache.hits
+    response = client.post("/accent", json={"text": TEXTS[0]}, headers={"X-Server-Timing": "1"})
+    assert response.json() == {"accent": process_text(TEXTS[0], *dictionaries)}
+    assert server.result_cache.hits == hits + 1
+    assert 'cache;desc="hit"' in response.headers["Server-Timing"]
+
+
+def test_accent_rejects_empty_text(client):
+    response = client.post("/accent", json={"text": "  "})
+    assert response.status_code == 400
+
+
+def test_accent_batch(client, dictionaries):
+    texts = [TEXTS[1], "", TEXTS[2], TEXTS[1]]
+    response = client.post("/accent/batch", json={"texts": texts})
+    assert response.status_code == 200
+    expected = [
+        {"accent": process_text(TEXTS[1], *dictionaries)},
+        {"error": "Text cannot be empty"},
+        {"accent": process_text(TEXTS[2], *dictionaries)},
+        {"accent": process_text(TEXTS[1], *dictionaries)},
+    ]
+    assert response.json() == {"results": expected}
+
+
+def test_accent_batch_rejects_too_many_texts(client, monkeypatch):
+    monkeypatch.setattr(server, "BATCH_MAX_TEXTS", 2)
+    response = client.post("/accent/batch", json={"texts": ["あ", "い", "う"]})
+    assert response.status_code == 400
+
+
+def test_accent_stream(client, dictionaries):
+    expected = []
+    for index, (sentence, result) in enumerate(process_sentences(STREAM_TEXT, *dictionaries)):
+        assert not isinstance(result, Exception)
+        expected.append({"index": index, "text": sentence, "accent": result})
+    assert len(expected) == 2
+
+    response = client.post("/accent/stream", json={"text": STREAM_TEXT})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == expected
+
+    response = client.post("/accent/stream", json={"text": STREAM_TEXT}, headers={"Accept": "text/event-stream"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [event for event in response.text.split("\n\n") if event]
+    assert [json.loads(event.removeprefix("data: ")) for event in events] == expected
+
+
+def test_busy_server_answers_503(client, busy_executor):
+    text = "混雑時には後で再試行してもらう。"
+    for path, body in (
+        ("/accent", {"text": text}),
+        ("/accent/batch", {"texts": [text]}),
+        ("/accent/stream", {"text": text}),
+    ):
+        response = client.post(path, json=body)
+        assert response.status_code == 503, path
+        assert response.headers["Retry-After"] == str(server.RETRY_AFTER)
+    assert busy_executor.stats()["rejected"] == 3
@@ -2,14 +2,77 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import os
+import re
 import subprocess
 import sys
 
-from abs2rel import abs2rel_text
-from format_accent import format_accent_text
-from mkdata_accent import mkdata_accent_text
-from rel2abs import rel2abs_text
-from rule import rule_text
+import numpy as np
+
+from abs2rel import abs2rel_records
+from accent_columns import AccentColumns, abs2rel_columns, rel2abs_columns, rule_columns
+from cache import ResultCache
+from crf_tagger import get_tagger as get_crf_tagger
+from crf_tagger import split_sequences
+from feature_index import check_feature_index
+from format_accent import format_accent_records
+from mecab_tagger import get_tagger as get_mecab_tagger
+from metrics import count_text, record_batch, record_text, stage
+from mkdata_accent import mkdata_accent_records
+from morpheme import Morpheme, format_phrases
+from rel2abs import rel2abs_records
+from rule import rule_records
+
+
+CRF_BACKEND = os.environ.get("CRF_BACKEND", "crfpp")
+
+# Number of phrases decoded at once by run_crf_columns
+CRF_BATCH_SIZE = 1024
+
+# Memo of accent phrases analyzed by label_phrases
+PHRASE_MEMO_MAX_ENTRIES = int(os.environ.get("PHRASE_MEMO_MAX_ENTRIES", "100000"))
+PHRASE_MEMO_MAX_BYTES = int(os.environ.get("PHRASE_MEMO_MAX_BYTES", str(64 * 1024 * 1024)))
+MEMO_SEIKEI = "seikei"
+MEMO_LABELLED = "labelled"
+# Approximate memory of a memoized morpheme (a labelled record with its
+# features and labels, as measured with sys.getsizeof) and of an entry
+MEMO_RECORD_BYTES = 1400
+MEMO_ENTRY_BYTES = 200
+
+
+def phrase_memo_size(key, value) -> int:
+    """Approximate the memory held by a phrase memo entry"""
+    records = value[1] if value and value[0] in (MEMO_SEIKEI, MEMO_LABELLED) else value
+    return MEMO_ENTRY_BYTES + 4 * len(key[2]) + MEMO_RECORD_BYTES * len(records)
+
+
+phrase_memo = ResultCache(PHRASE_MEMO_MAX_ENTRIES, PHRASE_MEMO_MAX_BYTES, sizeof=phrase_memo_size)
+
+# Features of a known word emitted by MeCab after its surface, by dictionary
+# layout (number of features): orth, pron, POS (4), cType, cForm, lemma,
+# lForm, goshu, iType (3), aType, aConType, aModType. The last one (f[28]) of
+# the 29-feature layout is not used: it makes MeCab fail on words with fewer
+# features, which are then analyzed again with the default output. The
+# 25-feature layout also emits all features (%H) to catch words with more.
+SEIKEI_FEATURES = {
+    25: (8, 9, 0, 1, 2, 3, 4, 5, 7, 6, 11, 16, 17, 18, 22, 23, 24),
+    29: (8, 9, 0, 1, 2, 3, 4, 5, 7, 6, 12, 13, 14, 17, 24, 25, 26, 28),
+}
+
+_seikei_layouts = {}
+
+# Models warned about having no text model for CRF_BACKEND=numpy
+_missing_text_models = set()
+
+# Texts processed by warm_up
+WARM_UP_TEXTS = (
+    "こんにちは、世界。",
+    "今日はいい天気ですね！散歩に行きませんか？",
+    "お仕事初日おつかれさま〜",
+)
+
+# A sentence ends with a run of 。！？ (and closing brackets after them), or a newline
+resentence = re.compile(r"[^。！？\n]*(?:[。！？]+[」』）)]*|\n|$)")
 
 
 def csvsplit(string):
@@ -32,6 +95,12 @@ def csvsplit(string):
     return outlist
 
 
+def split_features(features: str) -> list[str]:
+    """Split the CSV features of a MeCab node, filling empty fields with "*" """
+    f = csvsplit(features) if '"' in features else features.split(",")
+    return [field or "*" for field in f]
+
+
 def normalize_missing_pronunciation(orth: str, pron: str) -> str:
     """Normalize pronunciation only when it is missing and orth can fill it."""
     if pron == "*" and orth == "っ":
@@ -82,14 +151,34 @@ def parse_args():
         default="./tsuki_1.dic",
         help="MeCab user dictionary path (empty to disable)",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes to split accent phrases across",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Process each input line on its own and write JSONL (see bulk.py for files and resuming)",
+    )
     return parser.parse_args()
 
 
 def run_mecab(text, mecab_dicdir, mecab_userdic):
-    """Run MeCab command"""
+    """Run MeCab in-process, falling back to the mecab command without libmecab"""
+    tagger = get_mecab_tagger(mecab_dicdir, mecab_userdic)
+    if tagger is not None:
+        return tagger.parse(text)
+    return run_mecab_command(text, mecab_dicdir, mecab_userdic)
+
+
+def run_mecab_command(text, mecab_dicdir, mecab_userdic, options=()):
+    """Run MeCab command (with options, raising RuntimeError if it fails)"""
     command = ["mecab", f"--dicdir={mecab_dicdir}"]
     if mecab_userdic:
         command.append(f"--userdic={mecab_userdic}")
+    command.extend(options)
     result = subprocess.run(
         command,
         input=text,
@@ -97,126 +186,210 @@ def run_mecab(text, mecab_dicdir, mecab_userdic):
         text=True,
     )
     if result.returncode != 0:
+        if options:
+            raise RuntimeError(f"mecab error: {result.stderr}")
         print(f"mecab error: {result.stderr}", file=sys.stderr)
         sys.exit(1)
     return result.stdout
 
 
-def seikei_from_mecab(text, mecab_dicdir, mecab_userdic):
-    """Format MeCab output to match seikei fields"""
+def seikei_layout(mecab_dicdir, mecab_userdic):
+    """Return the feature layout (key of SEIKEI_FEATURES) of the dictionary, or None"""
+    key = (mecab_dicdir, mecab_userdic)
+    if key not in _seikei_layouts:
+        line = run_mecab("の", mecab_dicdir, mecab_userdic).split("\n", 1)[0]
+        nfeatures = len(split_features(line.partition("\t")[2]))
+        _seikei_layouts[key] = 29 if nfeatures >= 29 else 25 if nfeatures == 25 else None
+    return _seikei_layouts[key]
+
+
+def seikei_format_options(layout):
+    """MeCab output format options emitting the seikei features of known words"""
+    node_format = "%m\\t" + "\\t".join(f"%f[{index}]" for index in SEIKEI_FEATURES[layout])
+    if layout == 25:
+        node_format += "\\t%H"
+    return (
+        f"--node-format={node_format}\\n",
+        "--unk-format=%m\\t%H\\n",
+        "--eos-format=EOS\\n",
+    )
+
+
+def run_mecab_seikei(text, mecab_dicdir, mecab_userdic, layout):
+    """Run MeCab with the seikei output format of the dictionary layout
+
+    Lines MeCab fails on with that format (words with fewer features than the
+    layout) are analyzed again with the default output format.
+    """
+    if layout is None:
+        return run_mecab(text, mecab_dicdir, mecab_userdic)
+    options = seikei_format_options(layout)
+    tagger = get_mecab_tagger(mecab_dicdir, mecab_userdic, options)
+    if tagger is not None:
+        return tagger.parse(text, lambda line: run_mecab(line, mecab_dicdir, mecab_userdic))
+    try:
+        return run_mecab_command(text, mecab_dicdir, mecab_userdic, options)
+    except RuntimeError:
+        return run_mecab_command(text, mecab_dicdir, mecab_userdic)
+
+
+def seikei_morpheme(surface, f, bunsetsu_flag):
+    """Make a seikei record from the surface and feature fields of a MeCab node"""
+    irex = "O"
+    # Unknown words without pronunciation info should be treated as auxiliary symbols
+    if len(f) < 25:
+        return Morpheme(
+            surface,
+            "*",
+            "%s-%s-%s-%s" % (
+                f[0] if len(f) > 0 else "*",
+                f[1] if len(f) > 1 else "*",
+                f[2] if len(f) > 2 else "*",
+                f[3] if len(f) > 3 else "*",
+            ),
+            f[4] if len(f) > 4 else "*",
+            "*",
+            "*-*",
+            "*",
+            "*-*-*",
+            "*",
+            "*",
+            "*",
+            irex,
+            bunsetsu_flag,
+        )
+    elif len(f) == 25:
+        orth = f[8]
+        pron = normalize_missing_pronunciation(orth, f[9])
+        return Morpheme(
+            orth,
+            pron,
+            "%s-%s-%s-%s" % (f[0], f[1], f[2], f[3]),
+            f[4],
+            f[5],
+            "%s-%s" % (f[7], f[6]),
+            f[11],
+            "%s-%s-%s" % (f[16], f[17], f[18]),
+            f[22],
+            f[23],
+            f[24],
+            irex,
+            bunsetsu_flag,
+        )
+    elif len(f) >= 29:
+        orth = f[8]
+        pron = normalize_missing_pronunciation(orth, f[9])
+        return Morpheme(
+            orth,
+            pron,
+            "%s-%s-%s-%s" % (f[0], f[1], f[2], f[3]),
+            f[4],
+            f[5],
+            "%s-%s" % (f[7], f[6]),
+            f[12],
+            "%s-%s-%s" % (f[13], f[14], f[17]),
+            f[24],
+            f[25],
+            f[26],
+            irex,
+            bunsetsu_flag,
+        )
+    return None
+
+
+def seikei_format_morpheme(columns, bunsetsu_flag):
+    """Make a seikei record from the columns of a known word in the seikei output format"""
+    c = [column or "*" for column in columns]
+    return Morpheme(
+        c[1],
+        normalize_missing_pronunciation(c[1], c[2]),
+        f"{c[3]}-{c[4]}-{c[5]}-{c[6]}",
+        c[7],
+        c[8],
+        f"{c[9]}-{c[10]}",
+        c[11],
+        f"{c[12]}-{c[13]}-{c[14]}",
+        c[15],
+        c[16],
+        c[17],
+        "O",
+        bunsetsu_flag,
+    )
+
+
+def seikei_records(text, mecab_dicdir, mecab_userdic):
+    """Analyze text with MeCab into phrases of seikei morpheme records"""
     if not text.strip():
-        return ""
+        return []
 
-    output = []
+    phrases = []
+    phrase = []
     bunsetsu_flag = "/"
-    mecab_output = run_mecab(text, mecab_dicdir, mecab_userdic)
+    layout = seikei_layout(mecab_dicdir, mecab_userdic)
+    mecab_output = run_mecab_seikei(text, mecab_dicdir, mecab_userdic, layout)
 
     for line in mecab_output.strip().split("\n"):
         if line == "EOS":
-            output.append("")
+            phrases.append(phrase)
+            phrase = []
             bunsetsu_flag = "/"
             continue
 
         if "\t" not in line:
             continue
 
-        _, features = line.split("\t", 1)
-        f = csvsplit(features)
-
-        for ii in range(0, len(f)):
-            if f[ii] == "":
-                f[ii] = "*"
-
-        irex = "O"
-        # Unknown words without pronunciation info should be treated as auxiliary symbols
-        if len(f) < 25:
-            # Get the surface form from the original line
-            surface = line.split("\t")[0] if "\t" in line else "o"
-            output.append(
-                "%s %s %s-%s-%s-%s %s %s %s-%s %s %s-%s-%s %s %s %s %s %s"
-                % (
-                    surface,
-                    "*",
-                    f[0] if len(f) > 0 else "*",
-                    f[1] if len(f) > 1 else "*",
-                    f[2] if len(f) > 2 else "*",
-                    f[3] if len(f) > 3 else "*",
-                    f[4] if len(f) > 4 else "*",
-                    "*",
-                    "*",
-                    "*",
-                    "*",
-                    "*",
-                    "*",
-                    "*",
-                    "*",
-                    "*",
-                    "*",
-                    irex,
-                    bunsetsu_flag,
-                )
-            )
-        elif len(f) == 25:
-            orth = f[8]
-            pron = normalize_missing_pronunciation(orth, f[9])
-            output.append(
-                "%s %s %s-%s-%s-%s %s %s %s-%s %s %s-%s-%s %s %s %s %s %s"
-                % (
-                    orth,
-                    pron,
-                    f[0],
-                    f[1],
-                    f[2],
-                    f[3],
-                    f[4],
-                    f[5],
-                    f[7],
-                    f[6],
-                    f[11],
-                    f[16],
-                    f[17],
-                    f[18],
-                    f[22],
-                    f[23],
-                    f[24],
-                    irex,
-                    bunsetsu_flag,
-                )
-            )
-        elif len(f) >= 29:
-            orth = f[8]
-            pron = normalize_missing_pronunciation(orth, f[9])
-            output.append(
-                "%s %s %s-%s-%s-%s %s %s %s-%s %s %s-%s-%s %s %s %s %s %s"
-                % (
-                    orth,
-                    pron,
-                    f[0],
-                    f[1],
-                    f[2],
-                    f[3],
-                    f[4],
-                    f[5],
-                    f[7],
-                    f[6],
-                    f[12],
-                    f[13],
-                    f[14],
-                    f[17],
-                    f[24],
-                    f[25],
-                    f[26],
-                    irex,
-                    bunsetsu_flag,
-                )
-            )
+        columns = line.split("\t")
+        if len(columns) == 2:
+            # Default output: unknown words, and lines MeCab failed to format
+            morpheme = seikei_morpheme(columns[0], split_features(columns[1]), bunsetsu_flag)
+        elif layout == 25 and len(f := split_features(columns[-1])) != 25:
+            # The layout of the word differs (e.g. from a newer user dictionary)
+            morpheme = seikei_morpheme(columns[0], f, bunsetsu_flag)
+        else:
+            morpheme = seikei_format_morpheme(columns, bunsetsu_flag)
+        if morpheme is not None:
+            phrase.append(morpheme)
 
         bunsetsu_flag = "-"
 
-    return "\n".join(output)
+    if phrase:
+        phrases.append(phrase)
+    return phrases
+
+
+def seikei_from_mecab(text, mecab_dicdir, mecab_userdic):
+    """Format MeCab output to match seikei fields"""
+    return format_phrases(seikei_records(text, mecab_dicdir, mecab_userdic))
+
+
+def get_crf_decoder(model):
+    """Return the in-process CRF decoder for CRF_BACKEND, or None if unavailable
+
+    "crfpp" (default) loads the binary model through libcrfpp. "numpy" reads
+    the text model next to it (model + ".txt", written by `crf_learn -t` or
+    `crf_numpy.py -b`), and falls back to libcrfpp without one. None means
+    neither is available and crf_test has to be run.
+    """
+    if CRF_BACKEND == "numpy" and model not in _missing_text_models:
+        from crf_numpy import get_model
+
+        try:
+            return get_model(model + ".txt")
+        except FileNotFoundError:
+            _missing_text_models.add(model)
+            print(f"CRF_BACKEND=numpy: {model}.txt not found, using libcrfpp or crf_test", file=sys.stderr)
+    return get_crf_tagger(model)
 
 
 def run_crf_test(text, model):
+    """Run CRF in-process, falling back to the crf_test command"""
+    tagger = get_crf_decoder(model)
+    if tagger is not None:
+        return tagger.parse(text)
+    return run_crf_test_command(text, model)
+
+
+def run_crf_test_command(text, model):
     """Run crf_test command"""
     result = subprocess.run(
         ["crf_test", "-m", model],
@@ -230,164 +403,388 @@ def run_crf_test(text, model):
     return result.stdout
 
 
-def convert_long_vowel_mark(text):
-    """Convert long vowel mark ー to appropriate vowel for VOICEVOX compatibility
-
-    Japanese long vowel rules:
-    - After ア column (ア カ サ タ ナ ハ マ ヤ ラ ワ ガ ザ ダ バ パ): ー → ア
-    - After イ column (イ キ シ チ ニ ヒ ミ リ ギ ジ ビ ピ): ー → イ
-    - After ウ column (ウ ク ス ツ ヌ フ ム ユ ル グ ズ ブ プ): ー → ウ
-    - After エ column (エ ケ セ テ ネ ヘ メ レ ゲ ゼ デ ベ ペ): ー → エ
-    - After オ column (オ コ ソ ト ノ ホ モ ヨ ロ ヲ ゴ ゾ ド ボ ポ): ー → オ
+def run_crf_records(phrases, model):
+    """Append the CRF prediction to the labels of each morpheme record
 
-    Also removes punctuation marks that VOICEVOX doesn't accept.
+    Only this boundary goes through CRF++ rows; without an in-process decoder
+    the rows are written to the crf_test command instead.
     """
-    # Vowel column mapping based on last character
-    vowel_map = {
-        'ア': 'ア', 'カ': 'ア', 'サ': 'ア', 'タ': 'ア', 'ナ': 'ア',
-        'ハ': 'ア', 'マ': 'ア', 'ヤ': 'ア', 'ラ': 'ア', 'ワ': 'ア',
-        'ガ': 'ア', 'ザ': 'ア', 'ダ': 'ア', 'バ': 'ア', 'パ': 'ア',
-        'ファ': 'ア', 'ヴァ': 'ア',
-
-        'イ': 'イ', 'キ': 'イ', 'シ': 'イ', 'チ': 'イ', 'ニ': 'イ',
-        'ヒ': 'イ', 'ミ': 'イ', 'リ': 'イ', 'ギ': 'イ', 'ジ': 'イ',
-        'ビ': 'イ', 'ピ': 'イ', 'ディ': 'イ', 'ティ': 'イ', 'フィ': 'イ', 'ヴィ': 'イ',
-
-        'ウ': 'ウ', 'ク': 'ウ', 'ス': 'ウ', 'ツ': 'ウ', 'ヌ': 'ウ',
-        'フ': 'ウ', 'ム': 'ウ', 'ユ': 'ウ', 'ル': 'ウ', 'グ': 'ウ',
-        'ズ': 'ウ', 'ブ': 'ウ', 'プ': 'ウ', 'ドゥ': 'ウ', 'トゥ': 'ウ', 'ヴ': 'ウ',
-        'ッ': 'ウ',  # Small tsu followed by ー -> ウ
-
-        'エ': 'エ', 'ケ': 'エ', 'セ': 'エ', 'テ': 'エ', 'ネ': 'エ',
-        'ヘ': 'エ', 'メ': 'エ', 'レ': 'エ', 'ゲ': 'エ', 'ゼ': 'エ',
-        'デ': 'エ', 'ベ': 'エ', 'ペ': 'エ', 'フェ': 'エ', 'ヴェ': 'エ',
-
-        'オ': 'オ', 'コ': 'オ', 'ソ': 'オ', 'ト': 'オ', 'ノ': 'オ',
-        'ホ': 'オ', 'モ': 'オ', 'ヨ': 'オ', 'ロ': 'オ', 'ヲ': 'オ',
-        'ゴ': 'オ', 'ゾ': 'オ', 'ド': 'オ', 'ボ': 'オ', 'ポ': 'オ',
-        'フォ': 'オ', 'ヴォ': 'オ',
-
-        'ン': 'ン',  # ン after ー keeps as ン (shouldn't happen normally)
-
-        # Small kana (for compound sounds)
-        'ャ': 'ア', 'ュ': 'ウ', 'ョ': 'オ',
-        'ァ': 'ア', 'ィ': 'イ', 'ゥ': 'ウ', 'ェ': 'エ', 'ォ': 'オ',
-    }
-
-    # Punctuation marks to remove (VOICEVOX doesn't accept these)
-    # Keep 、 (comma) as it creates silence between phrases
-    # Keep ？ (full-width question mark) as it can be used at phrase end
-    punctuation_to_remove = set('。！…〜～ー・')  # Note: ー will be converted first
-
-    result = []
-    i = 0
-    while i < len(text):
-        char = text[i]
+    phrases = [phrase for phrase in phrases if phrase]
+    sequences = [[m.to_row() for m in phrase] for phrase in phrases]
+    tagger = get_crf_decoder(model)
+    if tagger is not None:
+        labels = tagger.tag_batch(sequences)
+    else:
+        text = "".join("\n".join(rows) + "\n\n" for rows in sequences)
+        output = run_crf_test_command(text, model)
+        labels = [
+            [row.rsplit("\t", 1)[1] for row in rows]
+            for rows in split_sequences(output)
+        ]
+
+    for phrase, hyps in zip(phrases, labels):
+        for m, hyp in zip(phrase, hyps):
+            m.labels.append(hyp)
+    return phrases
+
+
+def run_crf_columns(batch, labels, model):
+    """Return the CRF prediction ids for the columns followed by the label ids"""
+    hyp = np.zeros(len(batch), dtype=np.int32)
+    indexes = [i for i in range(batch.nphrases) if batch.offsets[i] < batch.offsets[i + 1]]
+    tagger = get_crf_decoder(model)
+    for chunk in range(0, len(indexes), CRF_BATCH_SIZE):
+        chunk_indexes = indexes[chunk:chunk + CRF_BATCH_SIZE]
+        sequences = [batch.phrase_rows(i, labels) for i in chunk_indexes]
+        if tagger is not None:
+            results = tagger.tag_batch(sequences)
+        else:
+            text = "".join("\n".join(rows) + "\n\n" for rows in sequences)
+            results = [
+                [row.rsplit("\t", 1)[1] for row in rows]
+                for rows in split_sequences(run_crf_test_command(text, model))
+            ]
+        for i, phrase_labels in zip(chunk_indexes, results):
+            start = batch.offsets[i]
+            hyp[start:start + len(phrase_labels)] = [batch.pool.intern(label) for label in phrase_labels]
+    return hyp
+
+
+# Vowel a long vowel mark ー stands for after each kana, for VOICEVOX. A
+# digraph (ファ, ディ, ドゥ, フェ, ヴォ, ...) takes the vowel of its small kana,
+# so the last character is enough. After anything else ー is ウ.
+LONG_VOWELS = {
+    **dict.fromkeys("アカサタナハマヤラワガザダバパャァ", "ア"),
+    **dict.fromkeys("イキシチニヒミリギジビピィ", "イ"),
+    **dict.fromkeys("ウクスツヌフムユルグズブプヴッュゥ", "ウ"),
+    **dict.fromkeys("エケセテネヘメレゲゼデベペェ", "エ"),
+    **dict.fromkeys("オコソトノホモヨロヲゴゾドボポョォ", "オ"),
+    "ン": "ン",
+}
+
+# Marks VOICEVOX doesn't accept (、 makes a pause and ？ a rising end, so they stay)
+DROPPED_MARKS = frozenset("。！…〜～・")
+
+# Punctuation VOICEVOX accepts in another form
+PUNCTUATION = {",": "、", "，": "、", "?": "？"}
+
+
+def label_phrases(text, mecab_dicdir, mecab_userdic, nmora=None, timings=None):
+    """Analyze accent phrases (one per line) into records labelled with accent types
+
+    A phrase is analyzed on its own, so labelled phrases are memoized by their
+    text and only phrases not seen before go through MeCab and the CRF. The
+    one input carried over from earlier phrases is the mora count mkdata_accent
+    uses for phrases without pronunciation (symbols), so those are memoized
+    per carried mora count. nmora is the count carried in from text before
+    this one. The time spent in each stage is added to timings if given.
+    """
+    lines = text.split("\n") if text.strip() else []
+    memo_key = (mecab_dicdir, mecab_userdic)
 
-        # Skip punctuation marks (but keep 、 and ？)
-        if char in punctuation_to_remove and char != 'ー':
-            i += 1
+    memoized = {}
+    unseen = []
+    for line in dict.fromkeys(lines):
+        if not line:
+            continue
+        entry = phrase_memo.get(memo_key + (line,))
+        if entry is None:
+            unseen.append(line)
+        else:
+            memoized[line] = entry
+    if unseen:
+        with stage("mecab", timings):
+            analyzed = seikei_records("\n".join(unseen), mecab_dicdir, mecab_userdic)
+        for line, phrase in zip(unseen, analyzed):
+            memoized[line] = (MEMO_SEIKEI, tuple(tuple(m.columns()) for m in phrase))
+
+    # Labelled records of each phrase, or the key of the phrase queued in pending
+    slots = []
+    pending = {}
+    for line in lines:
+        if not line:
+            slots.append(((), None))
+            continue
+        kind, *value = memoized[line]
+        if kind == MEMO_LABELLED:
+            records, nmora = value
+            slots.append((records, None))
             continue
 
-        if char == 'ー' and result:
-            # Look back to find the last kana character (skip ' and /)
-            last_kana = None
-            for j in range(len(result) - 1, -1, -1):
-                if result[j] not in ("'", "/"):
-                    # Check for multi-character kana (like ファ, ディ, etc.)
-                    if j > 0:
-                        two_char = ''.join(result[j-1:j+1])
-                        if two_char in vowel_map:
-                            last_kana = two_char
-                            break
-                    last_kana = result[j]
-                    break
-
-            if last_kana and last_kana in vowel_map:
-                result.append(vowel_map[last_kana])
+        rows = value[0]
+        symbols_only = all(row[1] == "*" for row in rows)
+        key = memo_key + ((line, nmora) if symbols_only else (line,))
+        if key not in pending:
+            records = phrase_memo.get(key) if symbols_only else None
+            if records is not None:
+                slots.append((records, None))
+                continue
+            with stage("mkdata_accent", timings):
+                phrase = mkdata_accent_records([[Morpheme(*row) for row in rows]], nmora)[0]
+            last_nmora = nmora
+            for m in phrase:
+                if m.pron != "*":
+                    last_nmora = int(m.nmora)
+            pending[key] = (line, rows, phrase, last_nmora)
+        slots.append((None, key))
+        nmora = pending[key][3]
+
+    if pending:
+        phrases = [phrase for _, _, phrase, _ in pending.values()]
+        with stage("rule", timings):
+            phrases = rule_records(phrases)
+        with stage("abs2rel", timings):
+            phrases = abs2rel_records(phrases)
+        with stage("crf", timings):
+            phrases = run_crf_records(phrases, "model_accent")
+        with stage("rel2abs", timings):
+            phrases = rel2abs_records(phrases)
+        for key, (line, rows, phrase, last_nmora) in pending.items():
+            if all(row[1] == "*" for row in rows):
+                phrase_memo.put(memo_key + (line,), (MEMO_SEIKEI, rows))
+                phrase_memo.put(key, tuple(phrase))
             else:
-                # Fallback: use ウ if we can't determine
-                result.append('ウ')
-        else:
-            result.append(char)
-        i += 1
+                phrase_memo.put(key, (MEMO_LABELLED, tuple(phrase), last_nmora))
 
-    return ''.join(result)
+    return [pending[key][2] if key is not None else records for records, key in slots]
 
 
-def normalize_punctuation(text):
-    """Normalize punctuation and boundaries for VOICEVOX compatibility"""
-    translation = {
-        ",": "、",
-        "，": "、",
-        "?": "？",
-    }
+def split_sentences(text: str) -> list[str]:
+    """Split text into sentences, keeping delimiters and dropping blank ones"""
+    return [m.group(0) for m in resentence.finditer(text) if m.group(0).strip()]
 
-    result = []
-    for char in text:
-        result.append(translation.get(char, char))
-    text = "".join(result)
 
-    while "//" in text:
-        text = text.replace("//", "/")
+def normalize_input(input_text: str) -> str:
+    """Normalize input text before analysis (texts normalized alike give the same result)"""
+    return input_text.replace("〜", "ー").replace("～", "ー")
 
-    text = text.replace("/、", "、")
-    text = text.replace("、/", "、")
 
-    while "、、" in text:
-        text = text.replace("、、", "、")
+def label_text(
+    input_text: str,
+    mecab_dicdir: str,
+    mecab_userdic: str | None,
+    nmora: int | None = None,
+    timings: dict | None = None,
+):
+    """Analyze text into accent phrases of labelled records (process_text before formatting)"""
+    input_text = normalize_input(input_text)
 
-    text = text.replace("/？", "？")
-    text = text.replace("'？", "？")
+    with stage("segmentation", timings):
+        phrase_segmented_text = split_by_pyopenjtalk(input_text)
+    return label_phrases(phrase_segmented_text, mecab_dicdir, mecab_userdic, nmora, timings)
 
-    # Strip / and 、 from start and end, but preserve ？
-    text = text.strip("/")
-    text = text.strip("、")
 
-    return text
+def format_text(phrases, timings: dict | None = None) -> str:
+    """Format labelled accent phrases and make them acceptable to VOICEVOX"""
+    with stage("format_accent", timings):
+        formatted = format_accent_records(m for phrase in phrases for m in phrase)
+    with stage("normalize", timings):
+        return normalize_accent(formatted)
 
 
-def process_text(input_text: str, mecab_dicdir: str, mecab_userdic: str | None) -> str:
+def process_text(
+    input_text: str,
+    mecab_dicdir: str,
+    mecab_userdic: str | None,
+    timings: dict | None = None,
+) -> str:
     """Process text and return accent-annotated result.
 
     Args:
         input_text: Input text to process
         mecab_dicdir: MeCab dictionary directory path
         mecab_userdic: MeCab user dictionary path (None to disable)
+        timings: Dict to fill with the seconds spent in each stage that ran
+            (by metrics.STAGES name), and the "morphemes" and "phrases" counts
 
     Returns:
         Accent-annotated text
     """
-    input_text = input_text.replace("〜", "ー").replace("～", "ー")
-
-    phrase_segmented_text = split_by_pyopenjtalk(input_text)
-    formatted_features_2nd = seikei_from_mecab(
-        phrase_segmented_text, mecab_dicdir, mecab_userdic
-    )
-    accent_features = mkdata_accent_text(formatted_features_2nd)
-    rule_based_accent = rule_text(accent_features)
-    relative_labels = abs2rel_text(rule_based_accent)
-    accent_predictions = run_crf_test(relative_labels, "model_accent")
-    absolute_labels = rel2abs_text(accent_predictions)
-    formatted = format_accent_text(absolute_labels)
-
-    if formatted:
-        formatted = convert_long_vowel_mark(formatted)
-        result = normalize_punctuation(formatted)
-    else:
-        result = ""
+    if timings is None:
+        timings = {}
+    phrases = label_text(input_text, mecab_dicdir, mecab_userdic, timings=timings)
+    result = format_text(phrases, timings)
+    record_text(input_text, phrases, timings)
 
     return result
 
 
+def process_sentence(sentence: str, mecab_dicdir: str, mecab_userdic: str | None, nmora: int | None = None):
+    """Process one sentence of a text, returning (result, mora count carried to the next).
+
+    nmora is the count carried in from the sentences before it. A sentence
+    that fails returns its exception as the result and carries nmora on.
+    """
+    timings = {}
+    try:
+        phrases = label_text(sentence, mecab_dicdir, mecab_userdic, nmora, timings)
+        result = format_text(phrases, timings)
+    except Exception as e:
+        return e, nmora
+    record_text(sentence, phrases, timings)
+    for phrase in phrases:
+        for m in phrase:
+            if m.pron != "*":
+                nmora = int(m.nmora)
+    return result, nmora
+
+
+def process_sentences(input_text: str, mecab_dicdir: str, mecab_userdic: str | None):
+    """Process text sentence by sentence, yielding (sentence, result) as each finishes.
+
+    The mora count carried between phrases is passed on from one sentence to
+    the next. A sentence that fails yields its exception as the result.
+    """
+    nmora = None
+    for sentence in split_sentences(input_text):
+        result, nmora = process_sentence(sentence, mecab_dicdir, mecab_userdic, nmora)
+        yield sentence, result
+
+
+def warm_up(mecab_dicdir: str, mecab_userdic: str | None) -> None:
+    """Load pyopenjtalk, MeCab, the CRF model and the feature index by processing a few texts"""
+    check_feature_index(mecab_dicdir, mecab_userdic)
+    for text in WARM_UP_TEXTS:
+        process_text(text, mecab_dicdir, mecab_userdic)
+
+
+def process_texts(
+    input_texts: list[str],
+    mecab_dicdir: str,
+    mecab_userdic: str | None,
+    return_exceptions: bool = False,
+    timings: dict | None = None,
+) -> list:
+    """Process many texts at once and return their accent-annotated results.
+
+    The phrases of all texts go through one MeCab call. Their features are kept
+    in one columnar batch (AccentColumns), relabelled with vectorized stages and
+    decoded in batches by the CRF. With return_exceptions, a text that fails on
+    its own gets the exception in place of its result instead of failing the
+    others. timings is filled with the seconds spent in each stage for the
+    whole batch.
+    """
+    if timings is None:
+        timings = {}
+    results = [None] * len(input_texts)
+
+    segmented = []
+    for index, input_text in enumerate(input_texts):
+        try:
+            with stage("segmentation", timings):
+                phrase_segmented_text = split_by_pyopenjtalk(normalize_input(input_text))
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results[index] = e
+            continue
+        segmented.append((index, phrase_segmented_text if phrase_segmented_text.strip() else ""))
+
+    # MeCab ends every line with EOS, so each text owns as many phrases as lines
+    with stage("mecab", timings):
+        analyzed = seikei_records(
+            "\n".join(text for _, text in segmented if text), mecab_dicdir, mecab_userdic
+        )
+    texts = []
+    start = 0
+    for index, text in segmented:
+        count = text.count("\n") + 1 if text else 0
+        try:
+            with stage("mkdata_accent", timings):
+                phrases = mkdata_accent_records(analyzed[start : start + count])
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results[index] = e
+        else:
+            texts.append((index, phrases))
+        start += count
+
+    batch = AccentColumns.from_records(phrase for _, phrases in texts for phrase in phrases)
+    with stage("rule", timings):
+        accent = rule_columns(batch)
+    with stage("abs2rel", timings):
+        relative_labels = abs2rel_columns(batch, accent)
+    with stage("crf", timings):
+        hyp = run_crf_columns(batch, relative_labels, "model_accent")
+    with stage("rel2abs", timings):
+        absolute_labels = batch.pool.intern_values(rel2abs_columns(batch, hyp))
+
+    start = 0
+    for index, phrases in texts:
+        morphemes = []
+        for phrase_index in range(start, start + len(phrases)):
+            morphemes.extend(batch.phrase_records(phrase_index, absolute_labels))
+        with stage("format_accent", timings):
+            formatted = format_accent_records(morphemes)
+        with stage("normalize", timings):
+            results[index] = normalize_accent(formatted)
+        count_text(input_texts[index], phrases)
+        start += len(phrases)
+    record_batch(timings)
+    return results
+
+
+def normalize_accent(formatted):
+    """Make formatted accent phrases acceptable to VOICEVOX, in one pass over the text
+
+    ー becomes the vowel of the last kana before it (skipping ' and /), or is
+    kept at the start. Marks VOICEVOX doesn't accept are dropped and
+    punctuation is converted. Runs of / and of 、 are collapsed, / next to 、
+    is dropped, and / then ' right before ？ are dropped. / and then 、 are
+    stripped from both ends.
+    """
+    result = []
+    # Whether anything was written, and the last character written other than ' and /
+    written = False
+    last = None
+    for char in formatted:
+        if char in DROPPED_MARKS:
+            continue
+        if char == "ー" and written:
+            char = LONG_VOWELS.get(last, "ウ")
+        written = True
+        if char != "'" and char != "/":
+            last = char
+
+        char = PUNCTUATION.get(char, char)
+        if char == "/":
+            if result and (result[-1] == "/" or result[-1] == "、"):
+                continue
+        elif char == "、":
+            if result and result[-1] == "/":
+                result.pop()
+            if result and result[-1] == "、":
+                continue
+        elif char == "？":
+            if result and result[-1] == "/":
+                result.pop()
+            if result and result[-1] == "'":
+                result.pop()
+        result.append(char)
+
+    return "".join(result).strip("/").strip("、")
+
+
 def main():
     args = parse_args()
-    input_text = sys.stdin.read()
-
     mecab_dicdir = args.mecab_dicdir
     mecab_userdic = args.mecab_userdic if args.mecab_userdic else None
 
-    result = process_text(input_text, mecab_dicdir, mecab_userdic)
+    if args.bulk:
+        from bulk import read_records, write_jsonl
+
+        write_jsonl(read_records(["-"], "text"), sys.stdout.buffer, mecab_dicdir, mecab_userdic, args.jobs)
+        return
+
+    input_text = sys.stdin.read()
+
+    if args.jobs > 1:
+        from parallel import process_text_parallel
+
+        result = process_text_parallel(input_text, mecab_dicdir, mecab_userdic, args.jobs)
+    else:
+        result = process_text(input_text, mecab_dicdir, mecab_userdic)
     print(result)
 
 